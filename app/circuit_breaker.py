@@ -0,0 +1,88 @@
+import time
+
+import metrics
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+
+# Circuit breaker por host de destino. Tras CIRCUIT_FAILURE_THRESHOLD fallos
+# seguidos (errores de red o respuestas 5xx) el circuito se abre y los disparos
+# a ese host se omiten sin enviar la petición. Pasados CIRCUIT_RESET_SECONDS se
+# deja pasar una petición de prueba: si va bien se cierra, si falla sigue abierto.
+
+circuit_skipped_total = metrics.Counter(
+    "cronmanager_circuit_skipped_total", "Disparos omitidos por tener abierto el circuito del host", ("host",))
+circuit_opened_total = metrics.Counter(
+    "cronmanager_circuit_opened_total", "Veces que se abrió el circuito de un host", ("host",))
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        return "closed" if self.opened_at is None else "open"
+
+    def allow(self, now: float):
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at >= self.reset_seconds:
+            # Semiabierto: pasa una sola prueba; la siguiente espera otro periodo completo
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, now: float):
+        """Registra un fallo y devuelve True si el circuito acaba de abrirse."""
+        self.failures += 1
+        if self.failures < self.threshold:
+            return False
+        opened = self.opened_at is None
+        self.opened_at = now
+        return opened
+
+
+_breakers = {}
+
+metrics.Callback("cronmanager_circuits_open", "Hosts con el circuito abierto",
+                 lambda: sum(1 for breaker in _breakers.values() if breaker.opened_at is not None))
+
+
+def _breaker_for(host: str):
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+    return breaker
+
+
+def allow(host: str):
+    if CIRCUIT_FAILURE_THRESHOLD <= 0:
+        return True
+    if _breaker_for(host).allow(time.monotonic()):
+        return True
+    circuit_skipped_total.inc(host)
+    return False
+
+
+def record_success(host: str):
+    breaker = _breakers.get(host)
+    if breaker is not None:
+        breaker.record_success()
+
+
+def record_failure(host: str):
+    if CIRCUIT_FAILURE_THRESHOLD <= 0:
+        return
+    if _breaker_for(host).record_failure(time.monotonic()):
+        circuit_opened_total.inc(host)
+        print(f"[CircuitBreaker] Circuito abierto para {host} durante {CIRCUIT_RESET_SECONDS}s")
+
+
+def states():
+    return {host: {"state": breaker.state, "failures": breaker.failures} for host, breaker in _breakers.items()}
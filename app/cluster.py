@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import socket
+import time
+from bisect import bisect_right
+
+from config import (
+    CLUSTER_INSTANCE_ID,
+    CLUSTER_LEASE_SECONDS,
+    CLUSTER_HEARTBEAT_SECONDS,
+    CLUSTER_RECONCILE_SECONDS,
+    CLUSTER_VNODES,
+)
+
+# Miembros vivos: ZSET con score = vencimiento del lease (epoch)
+MEMBERS_KEY = "cronmanager:cluster:members"
+
+
+def _hash(value: str):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def default_instance_id():
+    return CLUSTER_INSTANCE_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class HashRing:
+    """Anillo de hashing consistente con nodos virtuales."""
+
+    def __init__(self, members=(), vnodes=CLUSTER_VNODES):
+        self.vnodes = vnodes
+        self.members = tuple(sorted(members))
+        points = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str):
+        if not self._hashes:
+            return None
+        index = bisect_right(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ClusterMembership:
+    """Membresía por lease en Redis y reparto de jobs entre las instancias vivas.
+
+    Cada instancia renueva su lease en MEMBERS_KEY; las que dejan de renovarlo
+    salen del anillo al vencer y sus jobs pasan a las demás en el siguiente
+    heartbeat. Se pueden crear varias instancias en el mismo proceso.
+    """
+
+    def __init__(self, redis_client, instance_id=None, lease_seconds=CLUSTER_LEASE_SECONDS,
+                 heartbeat_seconds=CLUSTER_HEARTBEAT_SECONDS, reconcile_seconds=CLUSTER_RECONCILE_SECONDS,
+                 vnodes=CLUSTER_VNODES):
+        self.redis = redis_client
+        self.instance_id = instance_id or default_instance_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self.vnodes = vnodes
+        self.ring = HashRing((self.instance_id,), vnodes)
+        self._task = None
+
+    def owns(self, job_id: str):
+        return self.ring.owner(job_id) == self.instance_id
+
+    @property
+    def members(self):
+        return self.ring.members
+
+    async def heartbeat(self):
+        """Renueva el lease, purga los vencidos y devuelve True si cambió la membresía."""
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(MEMBERS_KEY, {self.instance_id: now + self.lease_seconds})
+            pipe.zremrangebyscore(MEMBERS_KEY, "-inf", now)
+            pipe.zrange(MEMBERS_KEY, 0, -1)
+            _, _, members = await pipe.execute()
+
+        members = tuple(sorted(set(members) | {self.instance_id}))
+        if members == self.ring.members:
+            return False
+        print(f"[Cluster] Miembros activos: {list(members)}")
+        self.ring = HashRing(members, self.vnodes)
+        return True
+
+    async def claim_fire(self, job_id: str, guard_seconds: float):
+        """Reserva el disparo de un job para que no se repita en otra instancia durante un rebalanceo."""
+        key = f"cronmanager:fire:{job_id}"
+        guard_ms = max(int(guard_seconds * 1000), 1)
+        return bool(await self.redis.set(key, self.instance_id, nx=True, px=guard_ms))
+
+    async def run(self, on_change):
+        # Heartbeat periódico; on_change() redistribuye los jobs cuando cambian los miembros
+        # y también cada reconcile_seconds para recoger los jobs creados en otras instancias
+        last_reconcile = 0
+        while True:
+            try:
+                changed = await self.heartbeat()
+                if changed or time.monotonic() - last_reconcile >= self.reconcile_seconds:
+                    await on_change()
+                    last_reconcile = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Cluster] Error en heartbeat: {e}")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    def start(self, on_change):
+        self._task = asyncio.create_task(self.run(on_change))
+        print(f"[Cluster] Instancia {self.instance_id} unida al cluster")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.redis.zrem(MEMBERS_KEY, self.instance_id)
+        print(f"[Cluster] Instancia {self.instance_id} salió del cluster")
@@ -3,9 +3,9 @@ from dotenv import load_dotenv
 import redis.asyncio as aioredis
 from motor.motor_asyncio import AsyncIOMotorClient
 import aiomysql
-import json
 import asyncio
 from pathlib import Path
+from file_storage import FileStorage
 
 env_path = Path(__file__).resolve().parent.parent
 load_dotenv()
@@ -13,8 +13,10 @@ load_dotenv()
 # REDIS
 REDIS_HOST = os.getenv("REDIS_HOST", "145.223.126.134")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
-REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_DB = int(os.getenv("REDIS_DB", 2))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
 
 # MONGO
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
@@ -26,11 +28,16 @@ MYSQL_PORT = int(os.getenv("MYSQL_PORT", 3306))
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 MYSQL_DB = os.getenv("MYSQL_DB", "cronmanager")
+MYSQL_POOL_MIN = int(os.getenv("MYSQL_POOL_MIN", 1))
+MYSQL_POOL_MAX = int(os.getenv("MYSQL_POOL_MAX", 10))
 
 # BACKENDS
 CRON_STORAGE_BACKEND = os.getenv("CRON_STORAGE_BACKEND", "redis")
 LOG_STORAGE_BACKEND = os.getenv("LOG_STORAGE_BACKEND", "mongo")
 ENDPOINT_CONFIG_STORAGE_BACKEND = os.getenv("ENDPOINT_CONFIG_STORAGE_BACKEND", "mongo")
+# Destinos de los resultados de las ejecuciones, separados por coma:
+# "redis" (historial reciente), "log" (LOG_STORAGE_BACKEND) o un backend concreto (mongo, mysql, file)
+RESULT_SINKS = [name.strip().lower() for name in os.getenv("RESULT_SINKS", "redis").split(",") if name.strip()]
 
 # Nombres
 CRON_STORAGE_NAME = os.getenv("CRON_STORAGE_NAME", "crons")
@@ -41,18 +48,124 @@ ENDPOINT_CONFIG_NAME = os.getenv("ENDPOINT_CONFIG_NAME", "endpoints_config")
 CRON_LOG_FILE = os.getenv("CRON_LOG_FILE", "crons_file.log")
 APP_LOG_FILE = os.getenv("APP_LOG_FILE", "logs_file.log")
 ENDPOINT_CONFIG_FILE = os.getenv("ENDPOINT_CONFIG_FILE", "endpoints_config.log")
+FILE_STORAGE_SEGMENT_BYTES = int(os.getenv("FILE_STORAGE_SEGMENT_BYTES", 64 * 1024 * 1024))
+FILE_STORAGE_MAX_SEGMENTS = int(os.getenv("FILE_STORAGE_MAX_SEGMENTS", 20))  # 0 = sin límite
+FILE_STORAGE_BUFFER_RECORDS = int(os.getenv("FILE_STORAGE_BUFFER_RECORDS", 100))
+FILE_STORAGE_FLUSH_INTERVAL = float(os.getenv("FILE_STORAGE_FLUSH_INTERVAL", 1.0))
+FILE_STORAGE_MMAP = os.getenv("FILE_STORAGE_MMAP", "false").lower() == "true"
+
+# HTTP (cliente compartido para ejecutar los jobs)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 5))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 5))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# SCHEDULER (ejecución asíncrona en el event loop de la app)
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", 1000))
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", 30))
+SCHEDULER_COALESCE = os.getenv("SCHEDULER_COALESCE", "true").lower() == "true"
+SCHEDULER_SPREAD_PHASES = os.getenv("SCHEDULER_SPREAD_PHASES", "true").lower() == "true"
+SCHEDULER_JITTER_SECONDS = int(os.getenv("SCHEDULER_JITTER_SECONDS", 0))  # Por defecto sin jitter aleatorio
+
+# SOLAPAMIENTO DE EJECUCIONES (valores por defecto, cada job puede sobrescribirlos)
+# skip = se omite el disparo si el job sigue en curso, queue = espera en una cola acotada,
+# allow = hasta OVERLAP_MAX_CONCURRENT ejecuciones simultáneas del mismo job
+OVERLAP_POLICY = os.getenv("OVERLAP_POLICY", "skip").lower()
+OVERLAP_MAX_CONCURRENT = int(os.getenv("OVERLAP_MAX_CONCURRENT", 1))
+OVERLAP_MAX_QUEUED = int(os.getenv("OVERLAP_MAX_QUEUED", 1))
+JOB_LOCK_TTL_SECONDS = float(os.getenv("JOB_LOCK_TTL_SECONDS", 60))  # Se renueva mientras el job sigue en curso
+
+# ESTADO DEL SCHEDULER EN REDIS (último disparo de cada job) Y RECUPERACIÓN TRAS UN REINICIO
+# skip = se descartan los disparos perdidos, once = se ejecuta una vez, all = uno por disparo perdido (máx. N)
+CATCH_UP_POLICY = os.getenv("CATCH_UP_POLICY", "skip").lower()
+CATCH_UP_MAX_RUNS = int(os.getenv("CATCH_UP_MAX_RUNS", 10))
+SCHEDULE_STATE_FLUSH_SECONDS = float(os.getenv("SCHEDULE_STATE_FLUSH_SECONDS", 5))
+
+# LÍMITE DE PETICIONES POR HOST (token bucket): "host=tasa/ráfaga,host2=tasa", tasa en peticiones/segundo
+HOST_RATE_LIMITS = os.getenv("HOST_RATE_LIMITS", "")
+DEFAULT_HOST_RATE_LIMIT = os.getenv("DEFAULT_HOST_RATE_LIMIT", "")  # Vacío = sin límite
+
+# PLANTILLAS DE PETICIÓN: variables de entorno que {{env.NOMBRE}} puede leer. Solo las que
+# empiezan por el prefijo o están en la lista (separada por comas); el resto se rechaza
+TEMPLATE_ENV_PREFIX = os.getenv("TEMPLATE_ENV_PREFIX", "CRONMANAGER_SECRET_")
+TEMPLATE_ENV_ALLOWLIST = {name.strip() for name in os.getenv("TEMPLATE_ENV_ALLOWLIST", "").split(",") if name.strip()}
+
+# OPERACIONES MASIVAS (/cronjob/bulk): máximo de elementos por llamada
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 50000))
+
+# EJECUCIONES MANUALES (/run): estado consultable en /executions/{id}
+EXECUTION_TTL_SECONDS = int(os.getenv("EXECUTION_TTL_SECONDS", 3600))
+EXECUTIONS_MAX_RECORDS = int(os.getenv("EXECUTIONS_MAX_RECORDS", 10000))  # Registros recientes en memoria
+
+# FEED EN VIVO (/events, server-sent events)
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", 1000))  # Eventos pendientes por cliente
+LIVE_FEED_HEARTBEAT_SECONDS = float(os.getenv("LIVE_FEED_HEARTBEAT_SECONDS", 15))
+
+# REINTENTOS (valores por defecto, cada job puede sobrescribirlos): backoff exponencial con jitter
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 3))
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", 1))
+RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("RETRY_BACKOFF_MAX_SECONDS", 30))
+RETRY_STATUS_CODES = [int(code) for code in os.getenv("RETRY_STATUS_CODES", "408,425,429,500,502,503,504").split(",")
+                      if code.strip()]
+RETRY_ATTEMPT_TIMEOUT = float(os.getenv("RETRY_ATTEMPT_TIMEOUT", HTTP_TIMEOUT))
+
+# CIRCUIT BREAKER POR HOST: se abre tras N fallos seguidos (0 = desactivado)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
+
+# HISTORIAL DE RESPUESTAS (valores por defecto, cada job puede sobrescribirlos; 0 = sin límite)
+RESPONSE_MAX_ENTRIES = int(os.getenv("RESPONSE_MAX_ENTRIES", 1000))
+RESPONSE_MAX_AGE_SECONDS = int(os.getenv("RESPONSE_MAX_AGE_SECONDS", 7 * 24 * 3600))
+
+# TAMAÑO DE LAS RESPUESTAS GUARDADAS (valores por defecto, cada job puede sobrescribirlos)
+RESPONSE_MODE = os.getenv("RESPONSE_MODE", "full").lower()  # full = cuerpo completo, summary = estado/latencia/cabeceras
+RESPONSE_MAX_BODY_BYTES = int(os.getenv("RESPONSE_MAX_BODY_BYTES", 0))  # 0 = sin límite
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "none").lower()  # none, zlib o zstd
+RESPONSE_COMPRESSION_LEVEL = int(os.getenv("RESPONSE_COMPRESSION_LEVEL", 6))
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))  # Por debajo no compensa
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1000))  # Respuestas de la API comprimidas con GZip
+
+# ESCRITURA DE RESULTADOS (write-behind por lotes)
+RESULT_QUEUE_SIZE = int(os.getenv("RESULT_QUEUE_SIZE", 10000))
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", 500))
+RESULT_FLUSH_INTERVAL = float(os.getenv("RESULT_FLUSH_INTERVAL", 1.0))
+
+# MÉTRICAS (con miles de jobs se puede desactivar la etiqueta job_id)
+METRICS_PER_JOB = os.getenv("METRICS_PER_JOB", "true").lower() == "true"
+
+# CLUSTER (reparto de jobs entre varias instancias)
+CLUSTER_ENABLED = os.getenv("CLUSTER_ENABLED", "false").lower() == "true"
+CLUSTER_INSTANCE_ID = os.getenv("CLUSTER_INSTANCE_ID", "")  # Vacío = hostname + pid
+CLUSTER_LEASE_SECONDS = int(os.getenv("CLUSTER_LEASE_SECONDS", 15))
+CLUSTER_HEARTBEAT_SECONDS = int(os.getenv("CLUSTER_HEARTBEAT_SECONDS", 5))
+CLUSTER_RECONCILE_SECONDS = int(os.getenv("CLUSTER_RECONCILE_SECONDS", 30))
+CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", 64))
+
+
+def job_setting(job, field, default):
+    # Valor propio del job o, si no lo define (o es null), el global de esta configuración
+    value = job.get(field)
+    return default if value is None else value
 
 
 # ========== REDIS ==========
 async def start_redis(attempts=10):
     try:
-        redis_client = aioredis.Redis(
+        pool = aioredis.ConnectionPool(
             host=REDIS_HOST,
             port=REDIS_PORT,
             db=REDIS_DB,
             password=REDIS_PASSWORD,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
             decode_responses=True
         )
+        redis_client = aioredis.Redis(connection_pool=pool)
         await redis_client.ping()
         print("[Redis] Conexión exitosa.")
         return redis_client
@@ -70,8 +183,9 @@ async def start_redis(attempts=10):
 # ========== MONGO ==========
 async def start_mongodb():
     try:
-        client = AsyncIOMotorClient(MONGO_URI)
+        client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000)
         db = client[MONGO_DB_NAME]
+        await db.command("ping")  # Motor conecta de forma perezosa; verificar antes de usarlo
         print("[MongoDB] Conexión exitosa.")
         return db
     except Exception as e:
@@ -82,45 +196,33 @@ async def start_mongodb():
 # ========== MYSQL ==========
 async def start_mysql():
     try:
-        conn = await aiomysql.connect(
+        pool = await aiomysql.create_pool(
             host=MYSQL_HOST,
             port=MYSQL_PORT,
             user=MYSQL_USER,
             password=MYSQL_PASSWORD,
             db=MYSQL_DB,
+            minsize=MYSQL_POOL_MIN,
+            maxsize=MYSQL_POOL_MAX,
             autocommit=True
         )
         print("[MySQL] Conexión exitosa.")
-        return conn
+        return pool
     except Exception as e:
         print(f"[MySQL] Error de conexión: {e}")
         return None
 
 
 # ========== FILE STORAGE ==========
-class FileStorage:
-    def __init__(self, filename):
-        self.filename = filename
-        # Crea el archivo si no existe
-        try:
-            open(self.filename, "a").close()
-        except Exception as e:
-            print(f"[FileStorage] Error inicializando archivo: {e}")
-
-    async def save(self, data):
-        try:
-            with open(self.filename, "a", encoding="utf-8") as f:
-                f.write(json.dumps(data) + "\n")
-        except Exception as e:
-            print(f"[FileStorage] Error guardando datos: {e}")
-
-    async def get_all(self):
-        try:
-            with open(self.filename, "r", encoding="utf-8") as f:
-                return [json.loads(line) for line in f.readlines()]
-        except Exception as e:
-            print(f"[FileStorage] Error leyendo archivo: {e}")
-            return []
+def _file_storage(filename):
+    return FileStorage(
+        filename,
+        max_segment_bytes=FILE_STORAGE_SEGMENT_BYTES,
+        max_segments=FILE_STORAGE_MAX_SEGMENTS,
+        buffer_records=FILE_STORAGE_BUFFER_RECORDS,
+        flush_interval=FILE_STORAGE_FLUSH_INTERVAL,
+        use_mmap=FILE_STORAGE_MMAP,
+    )
 
 
 # ========== FACTORY DE ALMACENAMIENTO ==========
@@ -132,20 +234,20 @@ async def get_storage(backend_type: str, fallback_file: str, resource_name: str)
         conn = await start_redis()
     elif backend == "mongo":
         db = await start_mongodb()
-        conn = db[resource_name] if db else None
+        conn = db[resource_name] if db is not None else None
     elif backend == "mysql":
-        conn = await start_mysql()
+        conn = await start_mysql()  # Pool de conexiones
         if conn:
             conn._table_name = resource_name  # puedes usarlo en funciones personalizadas
     elif backend == "file":
-        conn = FileStorage(fallback_file)
+        conn = _file_storage(fallback_file)
     else:
         print(f"[Config] BACKEND '{backend}' no soportado, usando archivo.")
-        conn = FileStorage(fallback_file)
+        conn = _file_storage(fallback_file)
 
     if conn is None:
         print(f"[Config] No se pudo conectar a '{backend}', usando archivo.")
-        conn = FileStorage(fallback_file)
+        conn = _file_storage(fallback_file)
 
     return conn
 
@@ -0,0 +1,93 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from uuid import uuid4
+
+import metrics
+import redis_manager
+import scheduler
+from config import EXECUTION_TTL_SECONDS, EXECUTIONS_MAX_RECORDS
+
+# Ejecuciones manuales: /run encola la ejecución en el event loop y devuelve su id
+# al momento; el estado (queued, running, succeeded, skipped, failed) se consulta
+# después en /executions/{id}. Los registros recientes viven en memoria y se
+# copian a Redis con TTL para que cualquier instancia pueda responder.
+
+_records = OrderedDict()
+_tasks = set()
+
+metrics.Callback("cronmanager_manual_executions_pending", "Ejecuciones manuales encoladas o en curso",
+                 lambda: len(_tasks))
+
+
+def _remember(record):
+    _records[record["id"]] = record
+    _records.move_to_end(record["id"])
+    while len(_records) > EXECUTIONS_MAX_RECORDS:
+        _records.popitem(last=False)
+
+
+async def _persist(record):
+    if redis_manager.r is None:
+        return
+    try:
+        await redis_manager.save_execution(record, EXECUTION_TTL_SECONDS)
+    except Exception as e:
+        print(f"[Executions] Error guardando la ejecución {record['id']}: {e}")
+
+
+async def _run(record, script_path):
+    record["status"] = "running"
+    record["started_at"] = datetime.now().isoformat()
+    await _persist(record)
+    try:
+        response = await scheduler.execute_job(script_path)
+        record["status"] = "succeeded" if response is not None else "skipped"
+        record["response"] = response
+    except asyncio.CancelledError:
+        record["status"] = "cancelled"
+        raise
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+    finally:
+        record["finished_at"] = datetime.now().isoformat()
+        await _persist(record)
+
+
+def submit(job):
+    """Encola una ejecución manual del job y devuelve su registro (sin esperar al resultado)."""
+    record = {
+        "id": str(uuid4()),
+        "job_id": job["id"],
+        "status": "queued",
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "response": None,
+        "error": None,
+    }
+    _remember(record)
+    # Copia del script_path: la definición guardada del job no se modifica
+    script_path = dict(job["script_path"], job_id=job["id"])
+    task = asyncio.create_task(_run(record, script_path))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return record
+
+
+async def get(execution_id):
+    record = _records.get(execution_id)
+    if record is None and redis_manager.r is not None:
+        record = await redis_manager.get_execution(execution_id)
+    return record
+
+
+async def stop():
+    # Las ejecuciones manuales pendientes se cancelan al apagar la app
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        print(f"[Executions] {len(tasks)} ejecuciones manuales canceladas")
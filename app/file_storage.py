@@ -0,0 +1,306 @@
+import asyncio
+import json
+import mmap
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+def _timestamp_of(data):
+    # Timestamp del registro en epoch; si no trae uno válido se usa el momento de escritura
+    value = data.get("timestamp") if isinstance(data, dict) else None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+class FileStorage:
+    """Almacén de solo anexado en segmentos con rotación por tamaño.
+
+    Los registros (una línea JSON cada uno) se escriben en {filename}.{seq:06d};
+    al superar max_segment_bytes se abre un segmento nuevo y, si hay más de
+    max_segments, se borran los más antiguos. {filename}.idx guarda un índice
+    persistente (segmento, offset, longitud, job_id, timestamp) que permite leer
+    solo los registros de un job o de un rango de tiempo sin recorrer los archivos.
+    Toda la E/S de disco se hace fuera del event loop.
+    """
+
+    def __init__(self, filename, max_segment_bytes=64 * 1024 * 1024, max_segments=20,
+                 buffer_records=100, flush_interval=1.0, use_mmap=False):
+        self.filename = filename
+        self.index_filename = f"{filename}.idx"
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        self.use_mmap = use_mmap
+
+        self._buffer = []
+        self._flush_handle = None
+        self._lock = asyncio.Lock()
+        self._by_job = defaultdict(list)  # job_id -> [(ts, seq, offset, length)]
+        self._segments = {}  # seq -> [min_ts, max_ts, tamaño]
+        self._active_seq = 0
+
+        try:
+            self._open()
+        except Exception as e:
+            print(f"[FileStorage] Error inicializando archivo: {e}")
+
+    # ========== ARRANQUE ==========
+    def _segment_path(self, seq):
+        return f"{self.filename}.{seq:06d}"
+
+    def _open(self):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        prefix = os.path.basename(self.filename) + "."
+        for name in os.listdir(directory):
+            suffix = name[len(prefix):]
+            if name.startswith(prefix) and suffix.isdigit():
+                seq = int(suffix)
+                self._segments[seq] = [None, None, os.path.getsize(os.path.join(directory, name))]
+
+        # Archivo de la versión anterior (un solo archivo sin índice): pasa a ser el segmento 0
+        if os.path.exists(self.filename) and 0 not in self._segments and os.path.getsize(self.filename):
+            os.replace(self.filename, self._segment_path(0))
+            self._segments[0] = [None, None, os.path.getsize(self._segment_path(0))]
+
+        if not self._segments:
+            open(self._segment_path(0), "a").close()
+            self._segments[0] = [None, None, 0]
+        self._active_seq = max(self._segments)
+
+        indexed = self._load_index()
+        for seq in sorted(self._segments):
+            if seq not in indexed:
+                self._rebuild_segment_index(seq)
+
+    def _load_index(self):
+        indexed = set()
+        if not os.path.exists(self.index_filename):
+            return indexed
+        with open(self.index_filename, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    seq, offset, length, job_id, ts = json.loads(line)
+                except (ValueError, TypeError):
+                    continue  # Línea truncada por un corte durante la escritura
+                if seq in self._segments:
+                    self._register(seq, offset, length, job_id, ts)
+                    indexed.add(seq)
+        return indexed
+
+    def _rebuild_segment_index(self, seq):
+        # Segmento sin índice (migrado o índice perdido): se indexa una sola vez
+        entries = []
+        offset = 0
+        with open(self._segment_path(seq), "rb") as f:
+            for raw in f:
+                try:
+                    data = json.loads(raw)
+                    entries.append((seq, offset, len(raw), data.get("job_id") if isinstance(data, dict) else None,
+                                    _timestamp_of(data)))
+                except ValueError:
+                    pass
+                offset += len(raw)
+        self._append_index(entries)
+        for entry in entries:
+            self._register(*entry)
+
+    def _register(self, seq, offset, length, job_id, ts):
+        self._by_job[job_id].append((ts, seq, offset, length))
+        bounds = self._segments[seq]
+        bounds[0] = ts if bounds[0] is None else min(bounds[0], ts)
+        bounds[1] = ts if bounds[1] is None else max(bounds[1], ts)
+
+    def _append_index(self, entries):
+        if not entries:
+            return
+        with open(self.index_filename, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(list(entry)) + "\n" for entry in entries))
+
+    # ========== ESCRITURA ==========
+    async def save(self, data):
+        self._buffer.append(data)
+        if len(self._buffer) >= self.buffer_records:
+            await self.flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_interval, lambda: asyncio.ensure_future(self.flush()))
+
+    async def save_many(self, records):
+        self._buffer.extend(records)
+        await self.flush()
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            records, self._buffer = self._buffer, []
+            seq = self._active_seq
+            try:
+                entries, size = await asyncio.to_thread(self._write, records, seq, self._segments[seq][2])
+            except Exception as e:
+                print(f"[FileStorage] Error guardando datos: {e}")
+                return
+            # El índice en memoria solo se modifica desde el event loop
+            for entry in entries:
+                self._register(*entry)
+            self._segments[seq][2] = size
+            if size >= self.max_segment_bytes:
+                await self._rotate()
+
+    def _write(self, records, seq, offset):
+        chunks = []
+        entries = []
+        for data in records:
+            raw = (json.dumps(data, default=str) + "\n").encode("utf-8")
+            job_id = data.get("job_id") if isinstance(data, dict) else None
+            entries.append((seq, offset, len(raw), job_id, _timestamp_of(data)))
+            chunks.append(raw)
+            offset += len(raw)
+
+        with open(self._segment_path(seq), "ab") as f:
+            f.write(b"".join(chunks))
+        self._append_index(entries)
+        return entries, offset
+
+    async def _rotate(self):
+        self._active_seq += 1
+        self._segments[self._active_seq] = [None, None, 0]
+        await asyncio.to_thread(lambda: open(self._segment_path(self._active_seq), "a").close())
+
+        expired = sorted(self._segments)[:-self.max_segments] if self.max_segments else []
+        if not expired:
+            return
+        for seq in expired:
+            del self._segments[seq]
+        for job_id in list(self._by_job):
+            kept = [entry for entry in self._by_job[job_id] if entry[1] in self._segments]
+            if kept:
+                self._by_job[job_id] = kept
+            else:
+                del self._by_job[job_id]
+        entries = sorted(
+            (seq, offset, length, job_id, ts)
+            for job_id, items in self._by_job.items()
+            for ts, seq, offset, length in items
+        )
+        await asyncio.to_thread(self._drop_segments, expired, entries)
+        print(f"[FileStorage] Rotación: {len(expired)} segmentos antiguos eliminados")
+
+    def _drop_segments(self, expired, entries):
+        for seq in expired:
+            os.remove(self._segment_path(seq))
+        # Reescribe el índice sin las entradas de los segmentos borrados
+        tmp = f"{self.index_filename}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(list(entry)) + "\n" for entry in entries))
+        os.replace(tmp, self.index_filename)
+
+    # ========== LECTURA ==========
+    async def iter_records(self, job_id=None, since=None, until=None, batch_size=1000):
+        """Generador asíncrono de registros, filtrando por job y/o rango de tiempo.
+
+        Con job_id solo se leen los offsets indexados de ese job; sin él se
+        recorren los segmentos cuyo rango de tiempo se solapa con el pedido.
+        """
+        await self.flush()
+        since, until = _to_epoch(since), _to_epoch(until)
+
+        if job_id is not None:
+            locations = [
+                (seq, offset, length)
+                for ts, seq, offset, length in self._by_job.get(job_id, ())
+                if (since is None or ts >= since) and (until is None or ts <= until)
+            ]
+            locations.sort()
+            for i in range(0, len(locations), batch_size):
+                try:
+                    records = await asyncio.to_thread(self._read_locations, locations[i:i + batch_size])
+                except FileNotFoundError:
+                    continue  # Segmento eliminado por una rotación durante la lectura
+                for record in records:
+                    yield record
+            return
+
+        for seq, (min_ts, max_ts, size) in sorted((seq, list(bounds)) for seq, bounds in self._segments.items()):
+            # Sin límites conocidos (segmento sin entradas indexadas) se recorre entero
+            if not size or (since is not None and max_ts is not None and max_ts < since) \
+                    or (until is not None and min_ts is not None and min_ts > until):
+                continue
+            offset = 0
+            while offset < size:
+                try:
+                    records, offset = await asyncio.to_thread(self._read_segment_chunk, seq, offset, size, batch_size)
+                except FileNotFoundError:
+                    break  # Segmento eliminado por una rotación durante la lectura
+                for record in records:
+                    ts = _timestamp_of(record)
+                    if (since is None or ts >= since) and (until is None or ts <= until):
+                        yield record
+
+    def _read_locations(self, locations):
+        records = []
+        current_seq, f, view = None, None, None
+        try:
+            for seq, offset, length in locations:
+                if seq != current_seq:
+                    if view is not None:
+                        view.close()
+                    if f is not None:
+                        f.close()
+                    f = open(self._segment_path(seq), "rb")
+                    view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.use_mmap else None
+                    current_seq = seq
+                if view is not None:
+                    raw = view[offset:offset + length]
+                else:
+                    f.seek(offset)
+                    raw = f.read(length)
+                records.append(json.loads(raw))
+        finally:
+            if view is not None:
+                view.close()
+            if f is not None:
+                f.close()
+        return records
+
+    def _read_segment_chunk(self, seq, offset, size, batch_size):
+        records = []
+        with open(self._segment_path(seq), "rb") as f:
+            f.seek(offset)
+            while len(records) < batch_size and offset < size:
+                raw = f.readline()
+                if not raw:
+                    break
+                offset += len(raw)
+                try:
+                    records.append(json.loads(raw))
+                except ValueError:
+                    continue
+        return records, offset
+
+    async def get_all(self):
+        try:
+            return [record async for record in self.iter_records()]
+        except Exception as e:
+            print(f"[FileStorage] Error leyendo archivo: {e}")
+            return []
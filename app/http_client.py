@@ -0,0 +1,107 @@
+import httpx
+import metrics
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_TIMEOUT,
+    HTTP2_ENABLED,
+)
+
+# HTTP/2 solo si el paquete h2 está instalado (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client = None
+
+# Contadores del pool: de las peticiones con respuesta, las que reutilizaron una
+# conexión abierta frente a las que tuvieron que abrir una nueva (TCP + TLS), y las
+# que fallaron sin respuesta
+pool_stats = {
+    "requests": 0,
+    "reused_connections": 0,
+    "new_connections": 0,
+    "errors": 0,
+}
+
+metrics.Callback("cronmanager_http_requests_total", "Peticiones enviadas con el cliente compartido",
+                 lambda: pool_stats["requests"], "counter")
+metrics.Callback("cronmanager_http_reused_connections_total", "Peticiones que reutilizaron una conexión del pool",
+                 lambda: pool_stats["reused_connections"], "counter")
+metrics.Callback("cronmanager_http_new_connections_total", "Peticiones que abrieron una conexión nueva",
+                 lambda: pool_stats["new_connections"], "counter")
+metrics.Callback("cronmanager_http_errors_total", "Peticiones sin respuesta (conexión, timeout o pool agotado)",
+                 lambda: pool_stats["errors"], "counter")
+
+
+def get_client():
+    """Devuelve el cliente HTTP compartido, creándolo la primera vez."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                HTTP_TIMEOUT,
+                connect=HTTP_CONNECT_TIMEOUT,
+                pool=HTTP_POOL_TIMEOUT,
+            ),
+            http2=HTTP2_ENABLED and HTTP2_AVAILABLE,
+        )
+        print(f"[HTTP] Cliente compartido creado (http2={HTTP2_ENABLED and HTTP2_AVAILABLE}, "
+              f"max_connections={HTTP_MAX_CONNECTIONS}, keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS})")
+    return _client
+
+
+def attempt_timeout(seconds):
+    """Timeout de un intento: lectura y escritura por job, conexión y pool los del cliente."""
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT,
+                         read=seconds, write=seconds)
+
+
+async def request(method, url, **kwargs):
+    """Envía una petición con el cliente compartido y registra si reutilizó conexión."""
+    opened = False
+
+    async def trace(event_name, info):
+        nonlocal opened
+        if event_name == "connection.connect_tcp.started":
+            opened = True
+
+    extensions = dict(kwargs.pop("extensions", None) or {})
+    extensions["trace"] = trace
+
+    pool_stats["requests"] += 1
+    try:
+        response = await get_client().request(method, url, extensions=extensions, **kwargs)
+    except httpx.HTTPError:
+        # Sin respuesta (p. ej. timeout esperando al pool) no se sabe si hubo conexión útil
+        pool_stats["errors"] += 1
+        raise
+    if opened:
+        pool_stats["new_connections"] += 1
+    else:
+        pool_stats["reused_connections"] += 1
+    return response
+
+
+def get_stats():
+    stats = dict(pool_stats)
+    stats["http2"] = HTTP2_ENABLED and HTTP2_AVAILABLE
+    return stats
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        print("[HTTP] Cliente compartido cerrado.")
+    _client = None
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+# Caché en proceso de las definiciones de jobs. Se llena al arrancar y se mantiene
+# coherente con los mensajes que redis_manager publica en CHANNEL en cada alta,
+# cambio o baja (de esta instancia o de cualquier otra), así el camino de
+# ejecución no lee Redis para consultar la metadata del job.
+CHANNEL = "cronmanager:jobs"
+
+_jobs = {}
+_task = None
+_listeners = []
+
+
+def get(job_id: str):
+    return _jobs.get(job_id)
+
+def put(job: dict):
+    _jobs[job["id"]] = job
+
+def remove(job_id: str):
+    _jobs.pop(job_id, None)
+
+def load(jobs):
+    _jobs.clear()
+    for job in jobs:
+        put(job)
+    print(f"[JobCache] {len(_jobs)} jobs en caché")
+
+def add_listener(callback):
+    # callback(action, job_id, job) se invoca al aplicar un cambio recibido por pub/sub
+    _listeners.append(callback)
+
+def encode_event(action: str, job_id: str, job: dict = None):
+    return json.dumps({"action": action, "id": job_id, "job": job})
+
+async def _apply(message):
+    event = json.loads(message)
+    action, job_id, job = event["action"], event["id"], event.get("job")
+    if action == "save" and job is not None:
+        put(job)
+    elif action == "delete":
+        remove(job_id)
+    for callback in _listeners:
+        result = callback(action, job_id, job)
+        if asyncio.iscoroutine(result):
+            await result
+
+async def _listen(redis_client, reload):
+    resubscribe = False
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(CHANNEL)
+            if resubscribe:
+                # Recargar tras reconectar por si se perdieron mensajes mientras tanto
+                load(await reload())
+            resubscribe = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    try:
+                        await _apply(message["data"])
+                    except Exception as e:
+                        print(f"[JobCache] Error aplicando cambio: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[JobCache] Suscripción interrumpida: {e}. Reintentando en 5 segundos...")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
+
+def start(redis_client, reload):
+    global _task
+    _task = asyncio.create_task(_listen(redis_client, reload))
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,77 @@
+import asyncio
+import json
+from datetime import datetime
+
+import metrics
+from config import LIVE_FEED_QUEUE_SIZE, LIVE_FEED_HEARTBEAT_SECONDS
+
+# Difusión en proceso de los eventos del CronManager hacia los clientes de /events.
+# Cada suscriptor tiene su propia cola acotada y un filtro opcional de job_ids;
+# publicar nunca bloquea: si un cliente lento llena su cola se descarta su evento
+# más antiguo. Los cambios de estado de los jobs llegan por el pub/sub de
+# job_cache (también los de otras instancias); los resultados de ejecución son
+# los de esta instancia.
+
+_subscribers = set()
+
+dropped_events_total = metrics.Counter(
+    "cronmanager_live_feed_dropped_total", "Eventos descartados por clientes lentos del feed en vivo")
+metrics.Callback("cronmanager_live_feed_subscribers", "Clientes conectados al feed en vivo",
+                 lambda: len(_subscribers))
+
+
+class Subscription:
+    def __init__(self, job_ids=None):
+        self.job_ids = frozenset(job_ids) if job_ids else None
+        self.queue = asyncio.Queue(maxsize=LIVE_FEED_QUEUE_SIZE)
+
+    def wants(self, event):
+        return self.job_ids is None or event.get("job_id") in self.job_ids
+
+    def push(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            dropped_events_total.inc()
+        self.queue.put_nowait(event)
+
+
+def subscribe(job_ids=None):
+    subscription = Subscription(job_ids)
+    _subscribers.add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    _subscribers.discard(subscription)
+
+
+def publish(event_type, job_id, **data):
+    if not _subscribers:
+        return
+    event = {"type": event_type, "job_id": job_id, "timestamp": datetime.now().isoformat(), **data}
+    for subscription in _subscribers:
+        if subscription.wants(event):
+            subscription.push(event)
+
+
+def on_job_changed(action, job_id, job):
+    # Listener de job_cache: altas, cambios (pausa/reanudación) y bajas de jobs
+    publish("job", job_id, action=action, job=job)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def stream(subscription, is_disconnected):
+    """Generador de server-sent events; envía un comentario de keep-alive si no hay eventos."""
+    try:
+        while not await is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), LIVE_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        unsubscribe(subscription)
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+import json
+import time
+from datetime import datetime
 from uuid import uuid4
-import redis_manager, scheduler
+import redis_manager, scheduler, http_client, metrics, job_cache, result_writer, retry_policy, circuit_breaker, overlap, executions, live_feed, payloads, schedule_state, request_template
+from cluster import ClusterMembership
+from config import CLUSTER_ENABLED, GZIP_MIN_SIZE, BULK_MAX_ITEMS
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Dict
-from config import start_redis
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, create_model
+from typing import Any, Dict, List, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 app = FastAPI()
 
@@ -18,39 +23,137 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos los métodos (GET, POST, etc.)
     allow_headers=["*"],  # Permitir todos los encabezados
+    expose_headers=["X-Next-Cursor"],  # Cursor de paginación del historial
 )
+# Listados e historiales comprimidos si el cliente acepta gzip (el feed SSE queda excluido)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
 
 # Crear el modelo para los datos de CronJob
 class CronJob(BaseModel):
     name: str
-    script_path: Dict[str, str]  # Debería ser un diccionario con una clave "url"
-    interval_seconds: int
+    # Destino: "url" y opcionalmente method, headers, params, json/form/body y timeout,
+    # con marcadores {{now}}, {{timestamp}}, {{uuid}}, {{job_id}} y {{env.NOMBRE}}
+    script_path: Dict[str, Any]
+    interval_seconds: Optional[int] = None  # Intervalo fijo, o bien una expresión cron
+    cron: Optional[str] = None  # Expresión cron de 5 campos ("*/5 * * * *")
+    timezone: Optional[str] = None  # Zona horaria de la expresión cron (p. ej. "Europe/Madrid")
+    start_date: Optional[datetime] = None  # Ventana de ejecución opcional
+    end_date: Optional[datetime] = None
     paused: bool = False  # Agregar el atributo paused
+    max_responses: Optional[int] = None  # Retención del historial (None = valor global)
+    response_max_age_seconds: Optional[int] = None
+    jitter_seconds: Optional[int] = None  # Variación aleatoria del disparo (None = valor global)
+    # Política de reintentos del job (None = valor global)
+    retry_max_attempts: Optional[int] = None
+    retry_backoff_seconds: Optional[float] = None
+    retry_backoff_max_seconds: Optional[float] = None
+    retry_status_codes: Optional[List[int]] = None
+    timeout_seconds: Optional[float] = None  # Timeout de cada intento
+    # Solapamiento consigo mismo (None = valor global): "skip", "queue" o "allow"
+    overlap_policy: Optional[str] = None
+    max_concurrent: Optional[int] = None  # Ejecuciones simultáneas con "allow"/"queue"
+    max_queued: Optional[int] = None  # Tamaño de la cola con "queue"
+    coalesce: Optional[bool] = None  # Agrupar los disparos perdidos en uno solo
+    distributed_lock: bool = False  # Lock en Redis para no solaparse entre instancias
+    # Qué se guarda de cada respuesta (None = valor global)
+    response_mode: Optional[str] = None  # "full" o "summary" (estado, latencia y cabeceras)
+    max_body_bytes: Optional[int] = None  # Tope del cuerpo guardado (0 = sin límite)
+    response_fields: Optional[List[str]] = None  # Rutas JSON a conservar ("data.items.0.id")
+    response_compression: Optional[str] = None  # "none", "zlib" o "zstd"
+    response_compression_level: Optional[int] = None
+    # Disparos perdidos con la app detenida (None = valor global): "skip", "once" o "all"
+    catch_up: Optional[str] = None
+    catch_up_max: Optional[int] = None  # Máximo de recuperaciones con "all"
+    tags: Optional[List[str]] = None  # Etiquetas para filtrar el listado y seleccionar jobs en lote
+    owner: Optional[str] = None  # Dueño del job (equipo, cliente...), filtrable en el listado
 
     def toggle(self):
         self.paused = not self.paused
         self.is_active = not self.paused  # Si está pausado, no está activo
 
+# Mismos campos que CronJob, todos opcionales: un PATCH solo envía los que cambian
+CronJobPatch = create_model(
+    "CronJobPatch",
+    **{name: (Optional[field.annotation], None) for name, field in CronJob.model_fields.items()},
+)
+
+class BulkSelector(BaseModel):
+    # Jobs afectados por una operación masiva: ids explícitos y/o todos los de una etiqueta
+    job_ids: Optional[List[str]] = None
+    tag: Optional[str] = None
+
+def job_from_model(job_id, cronjob):
+    # Definición que se guarda en Redis a partir del modelo validado
+    return {
+        "id": job_id,
+        "name": cronjob.name,
+        "script_path": cronjob.script_path,
+        "interval_seconds": cronjob.interval_seconds,
+        "cron": cronjob.cron,
+        "timezone": cronjob.timezone,
+        "start_date": cronjob.start_date.isoformat() if cronjob.start_date else None,
+        "end_date": cronjob.end_date.isoformat() if cronjob.end_date else None,
+        "paused": cronjob.paused,
+        "max_responses": cronjob.max_responses,
+        "response_max_age_seconds": cronjob.response_max_age_seconds,
+        "jitter_seconds": cronjob.jitter_seconds,
+        **{field: getattr(cronjob, field) for field in retry_policy.FIELDS},
+        **{field: getattr(cronjob, field) for field in overlap.FIELDS},
+        **{field: getattr(cronjob, field) for field in payloads.FIELDS},
+        "catch_up": cronjob.catch_up,
+        "catch_up_max": cronjob.catch_up_max,
+        "tags": cronjob.tags,
+        "owner": cronjob.owner,
+    }
+
+def validate_job(job_id, job):
+    # Petición, trigger (cron, zona horaria, ventana), solapamiento, respuestas y recuperación;
+    # ValueError si algo no es válido
+    request_template.compile_request(job["script_path"], job_id)
+    scheduler.build_trigger(job_id, scheduler.trigger_options(job))
+    overlap.settings_for(job)
+    payloads.settings_for(job)
+    scheduler.catch_up_settings(job)
+
+# Tiempos del último arranque (carga de jobs y registro en el scheduler)
+startup_stats = {"jobs_loaded": 0, "jobs_registered": 0, "load_seconds": 0.0}
+metrics.Callback("cronmanager_startup_load_seconds", "Duración de la carga de jobs en el arranque",
+                 lambda: startup_stats["load_seconds"])
+
 # Evento de startup para conectar a Redis y cargar los trabajos
 @app.on_event("startup")
 async def startup_event():
-    global redis_conn
-    redis_conn = await start_redis()  # Espera hasta que Redis esté disponible
+    redis_conn = await redis_manager.connect_to_redis()  # Espera hasta que Redis esté disponible
     if not redis_conn:
         print("[Startup] No se pudo conectar a Redis. Continuando sin conexión.")
+        scheduler.start()  # El scheduler debe arrancar dentro del event loop de la app
         return  # Si no hay conexión a Redis, termina el evento de inicio
 
-    redis_manager.connect_to_redis()
+    await redis_manager.migrate_keyspace()
+    await result_writer.start()
+
+    if CLUSTER_ENABLED:
+        # Registrarse antes de cargar los jobs para conocer el reparto actual
+        membership = ClusterMembership(redis_conn)
+        await membership.heartbeat()
+        scheduler.set_cluster(membership)
 
     print("[CronManager] Cargando trabajos desde Redis...")
-    jobs = redis_manager.get_all_cronjobs()
-    for job in jobs:
-        if 'paused' not in job:
-            job['paused'] = False
-        redis_manager.save_cronjob(job['id'], job)  # Guardar el estado actualizado
+    load_started = time.perf_counter()
+    # Una lectura masiva; solo se reescriben los jobs a los que les faltaban valores por defecto
+    jobs = await redis_manager.get_all_cronjobs(repair=True)
+
+    # Caché de definiciones para el camino de ejecución, invalidada por pub/sub
+    job_cache.load(jobs)
+    job_cache.add_listener(scheduler.on_job_changed)
+    job_cache.add_listener(live_feed.on_job_changed)
+    job_cache.start(redis_conn, redis_manager.get_all_cronjobs)
 
-    # Cargar los trabajos al scheduler después de haber verificado que todos estén pausados si es necesario
-    scheduler.load_jobs_from_redis()
+    # Registro en lote: con el scheduler detenido los jobs quedan pendientes hasta start().
+    # El último disparo guardado de cada job conserva el calendario y marca los perdidos
+    last_runs = await redis_manager.get_last_runs()
+    registered = scheduler.register_jobs(jobs, last_runs)
+    schedule_state.start()
 
     print("[CronManager] Verificando estado del scheduler...")
     if not scheduler.scheduler.running:
@@ -60,18 +163,52 @@ async def startup_event():
     else:
         print("[CronManager] El scheduler ya está en ejecución.")
     
-    # Verificar que los trabajos se hayan cargado correctamente
-    job_count = len(scheduler.scheduler.get_jobs())
-    print(f"[CronManager] Total de trabajos activos en el scheduler: {job_count}")
+    if scheduler.cluster is not None:
+        scheduler.cluster.start(scheduler.rebalance)
+
+    startup_stats["jobs_loaded"] = len(jobs)
+    startup_stats["jobs_registered"] = registered
+    startup_stats["load_seconds"] = time.perf_counter() - load_started
+    print(f"[CronManager] {len(jobs)} trabajos leídos, {registered} activos en el scheduler "
+          f"en {startup_stats['load_seconds']:.2f}s")
     print("[CronManager] Listo.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    print("[CronManager] Deteniendo scheduler y cerrando conexiones HTTP...")
+    if scheduler.cluster is not None:
+        await scheduler.cluster.stop()
+    await job_cache.stop()
+    await executions.stop()
+    await scheduler.shutdown()
+    await schedule_state.stop()  # Último volcado del calendario antes de cerrar Redis
+    await result_writer.stop()  # Volcar los resultados pendientes antes de cerrar Redis
+    await redis_manager.close()
+
 @app.get("/status")
-def status():
+async def status():
     try:
-        redis_manager.r.ping()
-        return {"status": "ok", "redis": "connected"}
+        await redis_manager.r.ping()
+        return {"status": "ok", "redis": "connected", "http_pool": http_client.get_stats(),
+                "executions": scheduler.execution_stats, "circuits": circuit_breaker.states()}
     except:
-        return {"status": "ok", "redis": "not connected"}
+        return {"status": "ok", "redis": "not connected", "http_pool": http_client.get_stats(),
+                "executions": scheduler.execution_stats, "circuits": circuit_breaker.states()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Formato de exposición de Prometheus
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/events")
+async def events(request: Request, job_id: Optional[List[str]] = Query(None)):
+    # Feed en vivo (server-sent events) de cambios de estado y resultados; ?job_id= filtra por job
+    subscription = live_feed.subscribe(job_id)
+    return StreamingResponse(
+        live_feed.stream(subscription, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/")
 def read_root():
@@ -82,31 +219,42 @@ def mostrar_vista():
     return FileResponse("templates/index.html")
 
 @app.get("/cronjob/")
-def list_jobs():
-    jobs = redis_manager.get_all_cronjobs()
+async def list_jobs(
+    response: Response,
+    tag: Optional[str] = None,
+    owner: Optional[str] = None,
+    host: Optional[str] = None,
+    active: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    # Filtros resueltos con los índices secundarios de Redis: solo se leen los jobs
+    # de la página. El siguiente cursor viaja en la cabecera X-Next-Cursor
+    job_ids, next_cursor = await redis_manager.list_cronjob_ids(
+        tag=tag, owner=owner, host=host, active=active, limit=limit, cursor=cursor)
+    jobs = [job for job in await redis_manager.get_cronjobs(job_ids) if job is not None]
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
     for job in jobs:
         job['is_active'] = not job.get("paused", False)  # Si está pausado, no está activo
+        job['next_run_time'] = scheduler.next_run_time(job['id'])
     return jobs
 
 # Crear un nuevo cronjob
 @app.post("/cronjob/")
-def create_cronjob(cronjob: CronJob):
+async def create_cronjob(cronjob: CronJob):
     try:
         print(f"[CronManager] Creando nuevo cronjob: {cronjob.name}")
         job_id = str(uuid4())
-        job = {
-            "id": job_id,
-            "name": cronjob.name,
-            "script_path": cronjob.script_path,
-            "interval_seconds": cronjob.interval_seconds,
-            "paused": cronjob.paused
-        }
-        redis_manager.save_cronjob(job_id, job)
+        job = job_from_model(job_id, cronjob)
+        # Validar la definición antes de guardar nada
+        validate_job(job_id, job)
+        await redis_manager.save_cronjob(job_id, job)
         
         # Si el trabajo no está pausado, añadirlo al scheduler
         if not cronjob.paused:
             print(f"[CronManager] Añadiendo job {job_id} al scheduler (no está pausado)")
-            scheduler.add_cronjob_to_scheduler(job_id, cronjob.script_path, cronjob.interval_seconds)
+            scheduler.schedule_job(job)
         else:
             print(f"[CronManager] Job {job_id} está pausado, no se añade al scheduler")
         
@@ -118,36 +266,156 @@ def create_cronjob(cronjob: CronJob):
         print(f"[CronManager] Error inesperado al crear cronjob: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
     
-@app.get("/run/{job_id}")
-def run_now(job_id: str):
-    job = redis_manager.get_cronjob(job_id)
-    if not job:
+# ========== OPERACIONES MASIVAS ==========
+async def read_bulk_items(request: Request):
+    # Array JSON o NDJSON (un job por línea, Content-Type application/x-ndjson)
+    body = await request.body()
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = [line for line in body.splitlines() if line.strip()]
+    else:
+        try:
+            items = json.loads(body or b"null")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"JSON inválido: {str(e)}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=422, detail="Se esperaba un array JSON de jobs")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo {BULK_MAX_ITEMS} jobs por llamada")
+    return items
+
+async def select_job_ids(selector: BulkSelector):
+    if selector.job_ids is None and selector.tag is None:
+        raise HTTPException(status_code=422, detail="Indica job_ids y/o tag")
+    job_ids = dict.fromkeys(selector.job_ids or [])  # Sin duplicados y en el orden recibido
+    if selector.tag is not None:
+        job_ids.update(dict.fromkeys(await redis_manager.find_cronjob_ids(selector.tag)))
+    job_ids = list(job_ids)
+    if len(job_ids) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Máximo {BULK_MAX_ITEMS} jobs por llamada")
+    return job_ids
+
+@app.post("/cronjob/bulk")
+async def create_cronjobs(request: Request):
+    # Alta masiva: se valida todo en una pasada, los válidos se guardan en un solo
+    # pipeline y se registran juntos en el scheduler; el resultado va por elemento
+    results = []
+    jobs = []
+    for index, item in enumerate(await read_bulk_items(request)):
+        try:
+            if isinstance(item, bytes):
+                cronjob = CronJob.model_validate_json(item)
+            else:
+                cronjob = CronJob.model_validate(item)
+            job_id = str(uuid4())
+            job = job_from_model(job_id, cronjob)
+            validate_job(job_id, job)
+        except ValueError as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+        jobs.append(job)
+        results.append({"index": index, "status": "created", "id": job_id})
+
+    if jobs:
+        await redis_manager.save_cronjobs(jobs)
+        registered = scheduler.register_jobs(jobs)
+        print(f"[CronManager] {len(jobs)} cronjobs creados en lote, {registered} añadidos al scheduler")
+    return {"created": len(jobs), "failed": len(results) - len(jobs), "results": results}
+
+async def set_bulk_paused(selector: BulkSelector, paused: bool):
+    job_ids = await select_job_ids(selector)
+    jobs = await redis_manager.set_cronjobs_paused(job_ids, paused)
+    scheduler.set_jobs_paused([job for job in jobs if job is not None], paused)
+    state = "paused" if paused else "active"
+    results = [{"id": job_id, "status": state if job is not None else "not_found"}
+               for job_id, job in zip(job_ids, jobs)]
+    return {"matched": sum(job is not None for job in jobs), "results": results}
+
+@app.post("/cronjob/bulk/pause")
+async def pause_jobs(selector: BulkSelector):
+    return await set_bulk_paused(selector, True)
+
+@app.post("/cronjob/bulk/resume")
+async def resume_jobs(selector: BulkSelector):
+    return await set_bulk_paused(selector, False)
+
+@app.post("/cronjob/bulk/delete")
+async def delete_jobs(selector: BulkSelector):
+    job_ids = await select_job_ids(selector)
+    deleted = await redis_manager.delete_cronjobs(job_ids)
+    scheduler.remove_jobs(job_ids)
+    results = [{"id": job_id, "status": "deleted" if existed else "not_found"}
+               for job_id, existed in zip(job_ids, deleted)]
+    return {"matched": sum(deleted), "results": results}
+
+@app.patch("/cronjob/{job_id}")
+async def update_cronjob(job_id: str, patch: CronJobPatch):
+    # Edición parcial: solo se escriben en el HASH los campos enviados y el job
+    # programado se modifica en sitio (reschedule solo si cambió el trigger)
+    current = await redis_manager.get_cronjob(job_id)
+    if not current:
         raise HTTPException(status_code=404, detail="Job not found")
-    
+
+    # Fechas en ISO con isoformat(), igual que job_from_model al crear, para comparar con lo
+    # guardado; null borra el campo (vuelve al valor global)
+    values = {
+        field: value.isoformat() if isinstance(value, datetime) else value
+        for field, value in patch.model_dump(exclude_unset=True).items()
+    }
+    changes = {field: value for field, value in values.items() if current.get(field) != value}
     try:
-        # Asegúrate de añadir el job_id al script_path antes de ejecutarlo
-        script_path = job["script_path"]
-        script_path["job_id"] = job_id
-        
-        response = scheduler.run_script(script_path)
-        if response is None:
-            response = {"message": "No output from the script"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al ejecutar el script: {str(e)}")
+        for field in ("name", "script_path", "paused"):
+            if field in changes and changes[field] is None:
+                raise ValueError(f"{field} no puede ser null")
+        if not changes:
+            return {"job": current, "changed": [], "scheduler": []}
+        validate_job(job_id, {**current, **changes})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Error de validación: {str(e)}")
 
-    # Verifica que la respuesta no sea None
-    if response and response != "No output from the script":
-        redis_manager.save_cronjob_response(job_id, response)
-    else:
-        response = {"message": "No output from the script"}
+    job = await redis_manager.update_cronjob(job_id, changes)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    print(f"[CronManager] Job {job_id} actualizado: {', '.join(sorted(changes))}")
+    return {"job": job, "changed": sorted(changes), "scheduler": scheduler.update_scheduled_job(job)}
 
-    return {"message": f"{job['name']} ejecutado manualmente", "response": response}
+class RunRequest(BaseModel):
+    job_ids: List[str]
+
+@app.api_route("/run/{job_id}", methods=["GET", "POST"], status_code=202)
+async def run_now(job_id: str):
+    # La ejecución se encola en el event loop; el resultado se consulta en /executions/{id}
+    job = job_cache.get(job_id) or await redis_manager.get_cronjob(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    execution = executions.submit(job)
+    return {"message": f"{job['name']} encolado para ejecución manual",
+            "execution_id": execution["id"], "status": execution["status"]}
+
+@app.post("/run", status_code=202)
+async def run_many(request: RunRequest):
+    # Ejecución manual de varios jobs: una sola lectura (MGET) y un id de ejecución por job
+    jobs = await redis_manager.get_cronjobs(request.job_ids)
+    results = []
+    for job_id, job in zip(request.job_ids, jobs):
+        if job is None:
+            results.append({"job_id": job_id, "error": "Job not found"})
+            continue
+        execution = executions.submit(job)
+        results.append({"job_id": job_id, "execution_id": execution["id"], "status": execution["status"]})
+    return results
+
+@app.get("/executions/{execution_id}")
+async def get_execution(execution_id: str):
+    execution = await executions.get(execution_id)
+    if execution is None:
+        raise HTTPException(status_code=404, detail="Execution not found")
+    return execution
 
-# Eliminar un cronjob
 @app.delete("/cronjob/{job_id}")
-def delete_job(job_id: str):
+async def delete_job(job_id: str):
     # Primero, eliminamos el cronjob de Redis
-    redis_manager.delete_cronjob(job_id)
+    await redis_manager.delete_cronjob(job_id)
     
     # Luego, verificamos si el trabajo existe en el scheduler antes de intentar eliminarlo
     job = scheduler.scheduler.get_job(job_id)
@@ -158,44 +426,63 @@ def delete_job(job_id: str):
         # Si el cronjob no existe, simplemente devolvemos un mensaje indicando que no se encontró
         return {"message": "Cronjob no encontrado, no se realizó ninguna acción"}
 
+@app.get("/cronjob/{job_id}/schedule")
+async def get_cronjob_schedule(job_id: str):
+    job = await redis_manager.get_cronjob(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return scheduler.describe_schedule(job)
+
 @app.get("/cronjob/{job_id}/responses")
-def get_cronjob_responses(job_id: str):
-    return redis_manager.get_cronjob_responses(job_id)
+async def get_cronjob_responses(
+    job_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[float] = None,
+):
+    # Paginación por cursor: el siguiente cursor viaja en la cabecera X-Next-Cursor
+    responses, next_cursor = await redis_manager.get_cronjob_responses(job_id, limit=limit, cursor=cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = repr(next_cursor)
+    return responses
 
 # Pausar un cronjob
 @app.post("/cronjob/{job_id}/pause")
-def pause_job(job_id: str):
+async def pause_job(job_id: str):
     try:
-        scheduler.scheduler.pause_job(job_id)
-        redis_manager.update_cronjob_status(job_id, True)
+        if scheduler.owns(job_id):
+            scheduler.scheduler.pause_job(job_id)
+        await redis_manager.update_cronjob_status(job_id, True)
         return {"message": f"Job {job_id} pausado"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"No se pudo pausar el job: {str(e)}")
 
 # Reanudar un cronjob
 @app.post("/cronjob/{job_id}/resume")
-def resume_job(job_id: str):
+async def resume_job(job_id: str):
     try:
-        scheduler.scheduler.resume_job(job_id)
-        redis_manager.update_cronjob_status(job_id, False)
+        if scheduler.owns(job_id):
+            scheduler.scheduler.resume_job(job_id)
+        await redis_manager.update_cronjob_status(job_id, False)
         return {"message": f"Job {job_id} reanudado"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"No se pudo reanudar el job: {str(e)}")
 
 @app.post("/cronjob/{job_id}/toggle")
-def toggle_job(job_id: str):
+async def toggle_job(job_id: str):
     try:
         # Intentamos obtener el cronjob desde Redis
-        job = redis_manager.get_cronjob(job_id)
+        job = await redis_manager.get_cronjob(job_id)
         if not job:
             raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado en Redis")
 
         # Verificamos si el job está en el scheduler antes de intentar pausarlo
+        # (en modo cluster solo la instancia dueña lo tiene programado)
         existing_job = scheduler.scheduler.get_job(job_id)
-        if not existing_job:
+        if not existing_job and scheduler.owns(job_id):
             # Si el trabajo no existe en el scheduler pero sí en Redis, lo agregamos
             if not job["paused"]:
-                scheduler.add_cronjob_to_scheduler(job_id, job["script_path"], job["interval_seconds"])
+                scheduler.schedule_job(job)
                 existing_job = scheduler.scheduler.get_job(job_id)
                 if not existing_job:
                     raise HTTPException(status_code=500, detail=f"No se pudo crear el job {job_id} en el scheduler")
@@ -203,10 +490,12 @@ def toggle_job(job_id: str):
         # Alternamos el estado de "paused"
         new_state = not job["paused"]
         job["paused"] = new_state
-        redis_manager.update_cronjob_status(job_id, new_state)
+        await redis_manager.update_cronjob_status(job_id, new_state)
 
         # Intentamos pausar o reanudar el trabajo en el scheduler
-        if new_state:
+        if not scheduler.owns(job_id):
+            pass
+        elif new_state:
             scheduler.scheduler.pause_job(job_id)
         else:
             scheduler.scheduler.resume_job(job_id)
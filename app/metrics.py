@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from config import METRICS_PER_JOB
+
+# Registro de métricas en memoria exportado en formato texto de Prometheus.
+# Todas las actualizaciones ocurren en el event loop de la app (un solo hilo),
+# por eso no hay locks: registrar un disparo es un par de operaciones de dict.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_registry = []
+
+
+def job_label(job_id):
+    # Con METRICS_PER_JOB=false todas las series se agregan en una sola etiqueta
+    return job_id if METRICS_PER_JOB else "all"
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Callback:
+    # El valor se lee en el momento del scrape (gauges y contadores que viven en otro módulo)
+    def __init__(self, name, documentation, callback, metric_type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.metric_type = metric_type
+        _registry.append(self)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}",
+                f"{self.name} {self.callback()}"]
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label_values -> [conteo por bucket (no acumulado), suma, total]
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        label_names = self.labels + ("le",)
+        for label_values, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _format_labels(label_names, label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ========== MÉTRICAS DEL CRONMANAGER ==========
+executions_total = Counter(
+    "cronmanager_executions_total", "Ejecuciones por job y resultado", ("job_id", "result"))
+retries_total = Counter(
+    "cronmanager_retries_total", "Reintentos realizados por job", ("job_id",))
+misfires_total = Counter(
+    "cronmanager_misfires_total", "Disparos perdidos o descartados por el scheduler", ("job_id", "reason"))
+scheduling_lag = Histogram(
+    "cronmanager_scheduling_lag_seconds", "Retraso entre la hora programada y el disparo real", ("job_id",))
+queue_wait = Histogram(
+    "cronmanager_queue_wait_seconds", "Tiempo de espera por el límite global de concurrencia")
+http_latency = Histogram(
+    "cronmanager_http_latency_seconds", "Latencia de la petición HTTP al destino", ("job_id",))
+response_size = Histogram(
+    "cronmanager_response_size_bytes", "Tamaño del cuerpo de la respuesta", ("job_id",), buckets=SIZE_BUCKETS)
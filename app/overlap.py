@@ -0,0 +1,150 @@
+import asyncio
+from collections import deque
+from uuid import uuid4
+
+import metrics
+import redis_manager
+from config import OVERLAP_POLICY, OVERLAP_MAX_CONCURRENT, OVERLAP_MAX_QUEUED, JOB_LOCK_TTL_SECONDS
+
+# Control de solapamiento por job, común a los disparos programados y a /run.
+# La decisión se toma antes del límite global de concurrencia, así los disparos
+# en cola no ocupan huecos del executor. Con distributed_lock el job además
+# reserva un lock en Redis que se renueva mientras la ejecución sigue en curso.
+
+POLICIES = ("skip", "queue", "allow")
+
+# Campos opcionales del job que sobrescriben los valores globales
+FIELDS = ("overlap_policy", "max_concurrent", "max_queued", "coalesce", "distributed_lock")
+
+overlap_decisions_total = metrics.Counter(
+    "cronmanager_overlap_decisions_total", "Decisiones de solapamiento por job (run, queued, skipped, locked)",
+    ("job_id", "decision"))
+
+
+def settings_for(job):
+    """Devuelve (política, ejecuciones simultáneas, tamaño de la cola) del job."""
+    job = job or {}
+    policy = (job.get("overlap_policy") or OVERLAP_POLICY).lower()
+    if policy not in POLICIES:
+        raise ValueError(f"overlap_policy debe ser uno de {', '.join(POLICIES)}; recibido '{policy}'")
+    limit = 1 if policy == "skip" else job.get("max_concurrent") or OVERLAP_MAX_CONCURRENT
+    max_queued = job.get("max_queued")
+    max_queued = OVERLAP_MAX_QUEUED if max_queued is None else max_queued
+    return policy, max(limit, 1), max_queued if policy == "queue" else 0
+
+
+def max_instances_for(job):
+    # Tope de instancias de APScheduler por encima del de este módulo, para que
+    # sea aquí (y no en el scheduler, en silencio) donde se decide qué pasa
+    _, limit, max_queued = settings_for(job)
+    return limit + max_queued + 1
+
+
+class _Slot:
+    def __init__(self):
+        self.running = 0
+        self.waiters = deque()
+
+
+class Ticket:
+    def __init__(self, job_id, lock_token=None, renewal=None):
+        self.job_id = job_id
+        self.lock_token = lock_token
+        self.renewal = renewal
+
+
+_slots = {}
+
+metrics.Callback("cronmanager_overlap_queued", "Ejecuciones esperando a que termine otra del mismo job",
+                 lambda: sum(len(slot.waiters) for slot in _slots.values()))
+
+
+def _decide(job_id, decision):
+    overlap_decisions_total.inc(metrics.job_label(job_id), decision)
+
+
+def _cleanup(job_id):
+    slot = _slots.get(job_id)
+    if slot is not None and not slot.running and not slot.waiters:
+        del _slots[job_id]
+
+
+def _release_local(job_id):
+    slot = _slots[job_id]
+    # El hueco pasa directamente al primero de la cola (sin decrementar running)
+    while slot.waiters:
+        waiter = slot.waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(None)
+            return
+    slot.running -= 1
+    _cleanup(job_id)
+
+
+async def _acquire_local(job_id, job):
+    policy, limit, max_queued = settings_for(job)
+    slot = _slots.setdefault(job_id, _Slot())
+    if slot.running < limit and not slot.waiters:
+        slot.running += 1
+        return True
+    if policy != "queue" or len(slot.waiters) >= max_queued:
+        _decide(job_id, "skipped")
+        _cleanup(job_id)
+        print(f"[Overlap] Job {job_id} sigue en curso ({slot.running}/{limit}): se omite el disparo")
+        return False
+
+    _decide(job_id, "queued")
+    waiter = asyncio.get_running_loop().create_future()
+    slot.waiters.append(waiter)
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        if waiter.done() and not waiter.cancelled():
+            _release_local(job_id)  # Ya tenía el hueco asignado: se cede al siguiente
+        else:
+            slot.waiters.remove(waiter)
+            _cleanup(job_id)
+        raise
+    return True
+
+
+async def _renew_lock(job_id, token):
+    while True:
+        await asyncio.sleep(JOB_LOCK_TTL_SECONDS / 3)
+        if not await redis_manager.extend_job_lock(job_id, token, JOB_LOCK_TTL_SECONDS):
+            print(f"[Overlap] Lock del job {job_id} perdido durante la ejecución")
+            return
+
+
+async def acquire(job_id, job):
+    """Decide si la ejecución puede empezar; devuelve un Ticket o None si se omite."""
+    if not await _acquire_local(job_id, job):
+        return None
+    if not (job or {}).get("distributed_lock") or redis_manager.r is None:
+        _decide(job_id, "run")
+        return Ticket(job_id)
+
+    token = uuid4().hex
+    try:
+        locked = await redis_manager.acquire_job_lock(job_id, token, JOB_LOCK_TTL_SECONDS)
+    except BaseException:
+        _release_local(job_id)
+        raise
+    if not locked:
+        _release_local(job_id)
+        _decide(job_id, "locked")
+        print(f"[Overlap] Job {job_id} en curso en otra instancia: se omite el disparo")
+        return None
+    _decide(job_id, "run")
+    return Ticket(job_id, token, asyncio.create_task(_renew_lock(job_id, token)))
+
+
+async def release(ticket):
+    try:
+        if ticket.renewal is not None:
+            ticket.renewal.cancel()
+            await redis_manager.release_job_lock(ticket.job_id, ticket.lock_token)
+    except Exception as e:
+        print(f"[Overlap] Error liberando el lock del job {ticket.job_id}: {e}")
+    finally:
+        _release_local(ticket.job_id)
@@ -0,0 +1,123 @@
+import base64
+import json
+import zlib
+from datetime import datetime
+
+from config import (
+    RESPONSE_MODE,
+    RESPONSE_MAX_BODY_BYTES,
+    RESPONSE_COMPRESSION,
+    RESPONSE_COMPRESSION_LEVEL,
+    RESPONSE_COMPRESSION_MIN_BYTES,
+    job_setting,
+)
+
+# zstd solo si el paquete zstandard está instalado; si no, se usa zlib
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+MODES = ("full", "summary")
+CODECS = ("none", "zlib", "zstd")
+
+# Campos opcionales del job que controlan qué se guarda de cada respuesta
+FIELDS = ("response_mode", "max_body_bytes", "response_fields", "response_compression", "response_compression_level")
+
+
+def settings_for(job):
+    """Devuelve (modo, máximo de bytes del cuerpo, rutas JSON, códec, nivel) del job."""
+    job = job or {}
+    mode = job_setting(job, "response_mode", RESPONSE_MODE).lower()
+    if mode not in MODES:
+        raise ValueError(f"response_mode debe ser uno de {', '.join(MODES)}; recibido '{mode}'")
+    codec = job_setting(job, "response_compression", RESPONSE_COMPRESSION).lower()
+    if codec not in CODECS:
+        raise ValueError(f"response_compression debe ser uno de {', '.join(CODECS)}; recibido '{codec}'")
+    if codec == "zstd" and not ZSTD_AVAILABLE:
+        codec = "zlib"
+    return (mode, job_setting(job, "max_body_bytes", RESPONSE_MAX_BODY_BYTES), job.get("response_fields") or None,
+            codec, job_setting(job, "response_compression_level", RESPONSE_COMPRESSION_LEVEL))
+
+
+# ========== FORMA DEL RESULTADO ==========
+def project(data, paths):
+    # Rutas con puntos ("items.0.id"); el resultado es {ruta: valor} sin las que no existen
+    projected = {}
+    for path in paths:
+        value = data
+        try:
+            for part in path.split("."):
+                value = value[int(part)] if isinstance(value, list) else value[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            continue
+        projected[path] = value
+    return projected
+
+
+def _parse_json(res):
+    try:
+        return res.json()
+    except ValueError:
+        raise ValueError(f"Respuesta no válida JSON: {res.text}")
+
+
+def shape(job, res, url, method, latency_seconds):
+    """Construye el resultado que se guarda para una respuesta HTTP según las opciones del job."""
+    mode, max_body_bytes, fields, _, _ = settings_for(job)
+    base = {"url": url, "method": method, "status_code": res.status_code}
+
+    if mode == "summary":
+        return {**base, "latency_ms": round(latency_seconds * 1000, 1), "headers": dict(res.headers),
+                "body_bytes": len(res.content), "timestamp": datetime.now().isoformat()}
+
+    if not res.content.strip():
+        raise ValueError("Respuesta vacía del servidor")
+
+    content_type = res.headers.get('Content-Type', 'unknown')
+    is_json = 'application/json' in content_type
+    if is_json and fields:
+        return project(_parse_json(res), fields)
+
+    if max_body_bytes and len(res.content) > max_body_bytes:
+        text = res.content[:max_body_bytes].decode(res.encoding or "utf-8", errors="ignore")
+        return {**base, "response_text": text, "truncated": True, "body_bytes": len(res.content),
+                "content_type": content_type, "timestamp": datetime.now().isoformat()}
+
+    if is_json:
+        return _parse_json(res)
+    return {**base, "response_text": res.text, "content_type": content_type,
+            "timestamp": datetime.now().isoformat()}
+
+
+# ========== COMPRESIÓN AL GUARDAR ==========
+def encode(data, codec, level):
+    """Devuelve los campos a guardar: {"data": ...} o, comprimido, {"codec": ..., "data_z": base64}."""
+    if not codec or codec == "none":
+        return {"data": data}
+    raw = json.dumps(data, default=str).encode("utf-8")
+    if len(raw) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return {"data": data}
+    if codec == "zstd" and ZSTD_AVAILABLE:
+        packed = zstandard.ZstdCompressor(level=level).compress(raw)
+    else:
+        codec, packed = "zlib", zlib.compress(raw, max(min(level, 9), 0))
+    return {"codec": codec, "data_z": base64.b64encode(packed).decode("ascii")}
+
+
+def decode(entry):
+    # Inversa de encode sobre una entrada ya leída ({"timestamp", "data"} o comprimida)
+    codec = entry.pop("codec", None)
+    if codec is None:
+        return entry
+    packed = base64.b64decode(entry.pop("data_z"))
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Respuesta comprimida con zstd y el paquete zstandard no está instalado")
+        raw = zstandard.ZstdDecompressor().decompress(packed)
+    else:
+        raw = zlib.decompress(packed)
+    entry["data"] = json.loads(raw)
+    return entry
@@ -0,0 +1,80 @@
+import asyncio
+from urllib.parse import urlsplit
+
+import metrics
+from config import HOST_RATE_LIMITS, DEFAULT_HOST_RATE_LIMIT
+
+# Token bucket por host de destino para suavizar la carga sobre cada microservicio.
+# Cada petición reserva un token (el saldo puede quedar negativo) y espera lo que
+# tarde en reponerse, así los que esperan salen en orden y sin sondeo.
+
+rate_limited_total = metrics.Counter(
+    "cronmanager_rate_limited_total", "Peticiones retrasadas por el límite del host", ("host",))
+rate_limit_wait = metrics.Histogram(
+    "cronmanager_rate_limit_wait_seconds", "Espera por el límite de peticiones del host", ("host",))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+
+    def reserve(self, now: float):
+        """Reserva un token y devuelve los segundos a esperar."""
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def parse_limit(spec: str):
+    # "tasa" o "tasa/ráfaga"
+    rate, _, burst = spec.partition("/")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+def parse_limits(spec: str):
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        host, _, limit = item.partition("=")
+        limits[host.strip().lower()] = parse_limit(limit.strip())
+    return limits
+
+
+_limits = parse_limits(HOST_RATE_LIMITS)
+_default_limit = parse_limit(DEFAULT_HOST_RATE_LIMIT) if DEFAULT_HOST_RATE_LIMIT else None
+_buckets = {}
+
+
+def host_of(url: str):
+    return (urlsplit(url).netloc or "").lower()
+
+
+def _bucket_for(host: str):
+    bucket = _buckets.get(host)
+    if bucket is None:
+        # Se busca primero host:puerto y luego solo el host
+        limit = _limits.get(host) or _limits.get(host.split(":")[0]) or _default_limit
+        if limit is None:
+            return None
+        bucket = _buckets[host] = TokenBucket(*limit)
+    return bucket
+
+
+def reserve(url: str):
+    """Reserva un token del host y devuelve los segundos a esperar (0 si no hay límite)."""
+    host = host_of(url)
+    bucket = _bucket_for(host)
+    if bucket is None:
+        return 0.0
+    wait = bucket.reserve(asyncio.get_running_loop().time())
+    if wait > 0:
+        rate_limited_total.inc(host)
+        rate_limit_wait.observe(wait, host)
+    return wait
@@ -1,87 +1,541 @@
-import redis
 import json
+import zlib
+from urllib.parse import urlparse
 
+from redis.exceptions import WatchError
 from datetime import datetime
+from config import start_redis, RESPONSE_MAX_ENTRIES, RESPONSE_MAX_AGE_SECONDS
+import job_cache
+import payloads
+import schedule_state
 
-r = redis.Redis(host="145.223.126.134", port=6379, db=2, decode_responses=True)
+# Cliente redis.asyncio compartido por la API y el scheduler (pool configurado en config.start_redis)
+r = None
 
+# Índice del catálogo de jobs (ZSET con score 0, ordenado por id) y
+# versión del esquema de claves para la migración única
+JOB_INDEX_KEY = "cronjobs:index"
+SCHEMA_VERSION_KEY = "cronmanager:schema_version"
+SCHEMA_VERSION = 5  # 3: cada job es un HASH (un campo JSON por atributo); 4: índices secundarios; 5: pausados en ZSET
+SCAN_BATCH_SIZE = 1000
 
-def connect_to_redis():
+# Último disparo de cada job (HASH job_id -> epoch) para recuperar el calendario tras un reinicio
+SCHEDULE_LAST_RUN_KEY = "cronmanager:schedule:last_run"
+
+# Ids de los jobs pausados (ZSET con score 0, como los índices secundarios): filtro
+# active del listado sin leer los jobs y base del recorrido para active=false
+PAUSED_KEY = "cronjobs:paused"
+
+
+def job_key(job_id: str):
+    return f"cronjob:{job_id}"
+
+def _encode_job(job: dict):
+    # Un campo por atributo con su valor en JSON; los None no se guardan
+    return {field: json.dumps(value) for field, value in job.items() if value is not None}
+
+def _decode_job(fields: dict):
+    if not fields:
+        return None
+    job = {field: json.loads(value) for field, value in fields.items()}
+    job.setdefault("paused", False)
+    return job
+
+def index_key(field: str, value: str):
+    # Índices secundarios: un ZSET con score 0 (orden lexicográfico por id) por etiqueta, dueño y host destino
+    return f"{JOB_INDEX_KEY}:{field}:{value}"
+
+def job_host(job: dict):
+    script_path = job.get("script_path")
+    url = script_path.get("url") if isinstance(script_path, dict) else None
+    return urlparse(url).hostname if url else None
+
+def _index_keys(job: dict):
+    keys = {index_key("tag", tag) for tag in job.get("tags") or ()}
+    if job.get("owner"):
+        keys.add(index_key("owner", job["owner"]))
+    host = job_host(job)
+    if host:
+        keys.add(index_key("host", host))
+    return keys
+
+def _write_indexes(pipe, job: dict, previous: dict = None):
+    # Índices secundarios y conjunto de pausados; con previous solo se toca la diferencia
+    job_id = job["id"]
+    old_keys = _index_keys(previous) if previous else set()
+    new_keys = _index_keys(job)
+    for key in old_keys - new_keys:
+        pipe.zrem(key, job_id)
+    for key in new_keys - old_keys:
+        pipe.zadd(key, {job_id: 0})
+    if job.get("paused", False):
+        pipe.zadd(PAUSED_KEY, {job_id: 0})
+    else:
+        pipe.zrem(PAUSED_KEY, job_id)
+
+def _remove_indexes(pipe, job: dict):
+    for key in _index_keys(job):
+        pipe.zrem(key, job["id"])
+    pipe.zrem(PAUSED_KEY, job["id"])
+
+def _write_job(pipe, data: dict):
+    # Reemplazo completo del job (DEL + HSET), sus índices y aviso a las cachés de todas las instancias
+    pipe.delete(job_key(data["id"]))
+    pipe.hset(job_key(data["id"]), mapping=_encode_job(data))
+    _write_indexes(pipe, data)
+    pipe.publish(job_cache.CHANNEL, job_cache.encode_event("save", data["id"], data))
+
+def lock_key(job_id: str):
+    # Lock distribuido de ejecución: evita que un job se solape consigo mismo entre instancias
+    return f"cronmanager:lock:{job_id}"
+
+def execution_key(execution_id: str):
+    # Estado de una ejecución manual (JSON con TTL) para consultarla desde cualquier instancia
+    return f"cronmanager:execution:{execution_id}"
+
+def responses_key(job_id: str):
+    # Historial de respuestas por job: ZSET con score = timestamp (epoch)
+    return f"cronjob_responses:{job_id}"
+
+
+async def connect_to_redis():
     global r
-    try:
-        r.ping()
-        print("[Redis] Conexión exitosa.")
-    except redis.exceptions.ConnectionError as e:
-        print(f"[Redis] Error de conexión: {e}")
-        raise e
+    r = await start_redis()
+    return r
 
-def save_cronjob(job_id: str, data: dict):
+async def close():
+    global r
+    if r is not None:
+        await r.aclose()
+        print("[Redis] Conexión cerrada.")
+    r = None
+
+async def save_cronjob(job_id: str, data: dict):
     data["paused"] = data.get("paused", False)  # Default: no está pausado
-    r.set(f"cronjob:{job_id}", json.dumps(data))
+    async with r.pipeline(transaction=True) as pipe:
+        _write_job(pipe, data)
+        pipe.zadd(JOB_INDEX_KEY, {job_id: 0})
+        await pipe.execute()
+    job_cache.put(data)
     print(f"[Redis] Job {job_id} guardado correctamente")
 
-def get_cronjob(job_id: str):
-    data = r.get(f"cronjob:{job_id}")
-    job = json.loads(data) if data else None
+async def get_cronjob(job_id: str):
+    job = _decode_job(await r.hgetall(job_key(job_id)))
     if job is None:
         print(f"[CronManager] Job con ID {job_id} no encontrado.")
     else:
-        if 'paused' not in job:
-            job['paused'] = False  # Asignar el valor por defecto si no existe
-        print(f"[CronManager] Job cargado: {job}")
+        print(f"[CronManager] Job {job_id} cargado")
     return job
 
-def get_all_cronjobs():
-    keys = r.keys("cronjob:*")
+async def _hgetall_many(job_ids):
+    async with r.pipeline(transaction=False) as pipe:
+        for job_id in job_ids:
+            pipe.hgetall(job_key(job_id))
+        return await pipe.execute()
+
+async def get_cronjobs(job_ids):
+    # Lectura de varios jobs en un solo pipeline de HGETALL; los que no existen vuelven como None
+    if not job_ids:
+        return []
+    return [_decode_job(fields) for fields in await _hgetall_many(job_ids)]
+
+async def update_cronjob(job_id: str, changes: dict):
+    """Actualiza solo los campos indicados (None = borrar el campo) y devuelve el job completo.
+
+    HSET/HDEL y la lectura del resultado van en una sola transacción; el job
+    actualizado se publica para las cachés. Devuelve None si el job no existe.
+    """
+    key = job_key(job_id)
+    written = {field: value for field, value in changes.items() if value is not None}
+    removed = [field for field, value in changes.items() if value is None]
+    async with r.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            previous = _decode_job(await pipe.hgetall(key))
+            if previous is None:
+                await pipe.unwatch()
+                return None
+            updated = {field: value for field, value in {**previous, **changes}.items() if value is not None}
+            pipe.multi()
+            if written:
+                pipe.hset(key, mapping=_encode_job(written))
+            if removed:
+                pipe.hdel(key, *removed)
+            _write_indexes(pipe, updated, previous)
+            pipe.hgetall(key)
+            results = await pipe.execute()
+        except WatchError:
+            # Otro cambio concurrente del mismo job: se reintenta sobre el estado nuevo
+            return await update_cronjob(job_id, changes)
+    job = _decode_job(results[-1])
+    await r.publish(job_cache.CHANNEL, job_cache.encode_event("save", job_id, job))
+    job_cache.put(job)
+    return job
+
+async def list_cronjob_ids(tag=None, owner=None, host=None, active=None, limit=None, cursor=None):
+    """Ids de los jobs que cumplen los filtros, en orden de id y a partir de cursor (exclusivo).
+
+    Se recorre con ZRANGEBYLEX el índice más pequeño de los pedidos (active=false
+    usa también el de pausados) y la pertenencia a los demás se comprueba por
+    lotes con ZMSCORE. Devuelve (ids, cursor de la página siguiente o None).
+    """
+    filters = [index_key(field, value) for field, value in (("tag", tag), ("owner", owner), ("host", host)) if value]
+    if active is False:
+        filters.append(PAUSED_KEY)
+        active = None
+    others = []
+    base = JOB_INDEX_KEY
+    if filters:
+        async with r.pipeline(transaction=False) as pipe:
+            for key in filters:
+                pipe.zcard(key)
+            sizes = await pipe.execute()
+        filters = [key for _, key in sorted(zip(sizes, filters))]
+        base, others = filters[0], filters[1:]
+
+    # Sin filtros que descarten candidatos basta con leer limit + 1 ids del índice
+    exact = not others and active is None
+    batch = limit + 1 if exact and limit else SCAN_BATCH_SIZE
+    start = f"({cursor}" if cursor else "-"
+    ids = []
+    while True:
+        candidates = await r.zrangebylex(base, start, "+", start=0, num=batch)
+        if exact:
+            matches = candidates
+        elif candidates:
+            async with r.pipeline(transaction=False) as pipe:
+                for key in others:
+                    pipe.zmscore(key, candidates)
+                if active:
+                    pipe.zmscore(PAUSED_KEY, candidates)
+                checks = await pipe.execute()
+            found = [[score is not None for score in scores] for scores in checks[:len(others)]]
+            if active:
+                found.append([score is None for score in checks[-1]])
+            matches = [candidate for candidate, *ok in zip(candidates, *found) if all(ok)]
+        else:
+            matches = []
+        ids.extend(matches)
+        if limit and len(ids) > limit:
+            return ids[:limit], ids[limit - 1]
+        if len(candidates) < batch:
+            return ids, None
+        start = f"({candidates[-1]}"
+
+async def get_all_cronjobs(repair=False):
+    # Dos round trips sin importar el tamaño del keyspace: ZRANGE del índice + pipeline de HGETALL.
+    # Con repair=True los registros a los que les faltaban valores por defecto se
+    # reescriben en un solo pipeline (solo esos)
+    job_ids = await r.zrange(JOB_INDEX_KEY, 0, -1)
+    if not job_ids:
+        print("[Redis] Se encontraron 0 trabajos en Redis")
+        return []
+
+    values = await _hgetall_many(job_ids)
     jobs = []
-    for k in keys:
-        data = r.get(k)
-        job = json.loads(data)
-        if 'paused' not in job:
-            job['paused'] = False  # Valor por defecto si no existe
+    stale = []
+    changed = []
+    for job_id, fields in zip(job_ids, values):
+        if not fields:
+            stale.append(job_id)  # El índice apunta a un job que ya no existe
+            continue
+        job = _decode_job(fields)
+        if 'paused' not in fields:
+            changed.append(job)  # Valor por defecto que faltaba en Redis
         jobs.append(job)
+
+    if stale:
+        await r.zrem(JOB_INDEX_KEY, *stale)
+        print(f"[Redis] Se limpiaron {len(stale)} entradas huérfanas del índice")
+    if repair and changed:
+        async with r.pipeline(transaction=False) as pipe:
+            for job in changed:
+                pipe.hset(job_key(job["id"]), "paused", json.dumps(False))
+            await pipe.execute()
+        print(f"[Redis] Se actualizaron {len(changed)} jobs con valores por defecto")
     print(f"[Redis] Se encontraron {len(jobs)} trabajos en Redis")
     return jobs
 
-def delete_cronjob(job_id: str):
-    r.delete(f"cronjob:{job_id}")
+async def save_cronjobs(jobs):
+    # Guardado masivo en un solo pipeline
+    async with r.pipeline(transaction=False) as pipe:
+        for data in jobs:
+            data["paused"] = data.get("paused", False)
+            _write_job(pipe, data)
+        pipe.zadd(JOB_INDEX_KEY, {data["id"]: 0 for data in jobs})
+        await pipe.execute()
+    for data in jobs:
+        job_cache.put(data)
+
+async def delete_cronjob(job_id: str):
+    job = _decode_job(await r.hgetall(job_key(job_id)))
+    schedule_state.forget([job_id])
+    async with r.pipeline(transaction=False) as pipe:
+        if job is not None:
+            _remove_indexes(pipe, job)
+        pipe.delete(job_key(job_id))
+        pipe.zrem(JOB_INDEX_KEY, job_id)
+        pipe.hdel(SCHEDULE_LAST_RUN_KEY, job_id)
+        pipe.publish(job_cache.CHANNEL, job_cache.encode_event("delete", job_id))
+        await pipe.execute()
+    job_cache.remove(job_id)
     print(f"[Redis] Job {job_id} eliminado de Redis")
 
-def save_cronjob_response(job_id, response):
-    try:
-        # Convertir la respuesta a JSON
-        response_json = json.dumps(response)
-        # Guardar la respuesta en Redis con un timestamp único
-        timestamp = datetime.now().isoformat()  # O cualquier otra forma de obtener un timestamp
-        key = f"cronjob_response:{job_id}:{timestamp}"
-        r.set(key, response_json)
-        print(f"[Redis] Respuesta del job {job_id} guardada en {key}")
-    except Exception as e:
-        print(f"Error guardando respuesta: {e}")
-
-def get_cronjob_responses(job_id: str):
-    keys = r.keys(f"cronjob_response:{job_id}:*")
+async def set_cronjobs_paused(job_ids, paused: bool):
+    """Pausa o reanuda un lote de jobs: una lectura y una transacción con solo el campo paused.
+
+    Devuelve, por cada id, el job actualizado (o ya en ese estado) o None si no existe.
+    """
+    jobs = await get_cronjobs(job_ids)
+    changed = [job for job in jobs if job is not None and job.get("paused", False) != paused]
+    if changed:
+        async with r.pipeline(transaction=True) as pipe:
+            for job in changed:
+                job["paused"] = paused
+                pipe.hset(job_key(job["id"]), "paused", json.dumps(paused))
+                pipe.publish(job_cache.CHANNEL, job_cache.encode_event("save", job["id"], job))
+            if paused:
+                pipe.zadd(PAUSED_KEY, {job["id"]: 0 for job in changed})
+            else:
+                pipe.zrem(PAUSED_KEY, *[job["id"] for job in changed])
+            await pipe.execute()
+        for job in changed:
+            job_cache.put(job)
+    print(f"[Redis] {len(changed)} jobs {'pausados' if paused else 'reanudados'} en lote")
+    return jobs
+
+async def delete_cronjobs(job_ids):
+    # Borrado masivo (una lectura para conocer los índices y una transacción);
+    # devuelve, por cada id, si el job existía
+    jobs = await get_cronjobs(job_ids)
+    schedule_state.forget(job_ids)
+    async with r.pipeline(transaction=True) as pipe:
+        for job_id, job in zip(job_ids, jobs):
+            if job is not None:
+                _remove_indexes(pipe, job)
+            pipe.delete(job_key(job_id))
+            pipe.zrem(JOB_INDEX_KEY, job_id)
+            pipe.hdel(SCHEDULE_LAST_RUN_KEY, job_id)
+            pipe.publish(job_cache.CHANNEL, job_cache.encode_event("delete", job_id))
+        await pipe.execute()
+    for job_id in job_ids:
+        job_cache.remove(job_id)
+    deleted = [job is not None for job in jobs]
+    print(f"[Redis] {sum(deleted)} jobs eliminados en lote")
+    return deleted
+
+async def find_cronjob_ids(tag: str):
+    # Ids de los jobs con la etiqueta indicada, desde su índice
+    return await r.zrange(index_key("tag", tag), 0, -1)
+
+async def save_cronjob_responses(records):
+    """Guarda un lote de respuestas en un solo pipeline.
+
+    Cada registro es un dict con job_id, response, timestamp (datetime) y,
+    opcionalmente, max_entries / max_age_seconds y compression / compression_level.
+    El historial de cada job se recorta una sola vez por lote, por cantidad y por antigüedad.
+    """
+    retention = {}
+    async with r.pipeline(transaction=False) as pipe:
+        for record in records:
+            job_id = record["job_id"]
+            timestamp = record["timestamp"]
+            stored = payloads.encode(record["response"], record.get("compression"), record.get("compression_level"))
+            entry = json.dumps({"timestamp": timestamp.isoformat(), **stored}, default=str)
+            pipe.zadd(responses_key(job_id), {entry: timestamp.timestamp()})
+            retention[job_id] = (record.get("max_entries"), record.get("max_age_seconds"), timestamp)
+
+        for job_id, (max_entries, max_age_seconds, timestamp) in retention.items():
+            key = responses_key(job_id)
+            max_entries = RESPONSE_MAX_ENTRIES if max_entries is None else max_entries
+            max_age_seconds = RESPONSE_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+            if max_entries > 0:
+                pipe.zremrangebyrank(key, 0, -(max_entries + 1))
+            if max_age_seconds > 0:
+                pipe.zremrangebyscore(key, "-inf", f"({timestamp.timestamp() - max_age_seconds}")
+                pipe.expire(key, max_age_seconds)  # Si el job deja de ejecutarse, el historial caduca
+        await pipe.execute()
+
+async def get_cronjob_responses(job_id: str, limit: int = None, cursor: float = None):
+    """Devuelve (respuestas, next_cursor), más reciente primero.
+
+    El cursor es el score (timestamp epoch) de la última respuesta recibida;
+    la siguiente página empieza justo antes de él. O(log N + limit).
+    """
+    max_score = f"({cursor}" if cursor is not None else "+inf"
+    if limit:
+        entries = await r.zrevrangebyscore(responses_key(job_id), max_score, "-inf",
+                                           start=0, num=limit, withscores=True)
+    else:
+        entries = await r.zrevrangebyscore(responses_key(job_id), max_score, "-inf", withscores=True)
+
     responses = []
-    for k in keys:
-        data = r.get(k)
+    for entry, _ in entries:
         try:
-            response = json.loads(data)
-            responses.append({
-                "timestamp": k.split(":")[-1],
-                "data": response
-            })
-        except json.JSONDecodeError:
-            print(f"Error decodificando respuesta en clave {k}")
-    
-    # Ordenar por timestamp (más reciente primero)
-    responses.sort(key=lambda x: x["timestamp"], reverse=True)
-    return responses
-
-def update_cronjob_status(job_id: str, paused: bool):
-    job = get_cronjob(job_id)
+            responses.append(payloads.decode(json.loads(entry)))
+        except (ValueError, zlib.error):
+            print(f"Error decodificando respuesta del job {job_id}")
+
+    next_cursor = entries[-1][1] if limit and len(entries) == limit else None
+    return responses, next_cursor
+
+async def update_cronjob_status(job_id: str, paused: bool):
+    # Solo se escribe el campo paused (HSET), sin leer ni reescribir el job entero
+    job = await update_cronjob(job_id, {"paused": paused})
     if job is not None:
-        job["paused"] = paused
-        save_cronjob(job_id, job)
         print(f"[Redis] Estado del job {job_id} actualizado a {'pausado' if paused else 'activo'}")
     else:
-        print(f"[CronManager] El trabajo con ID {job_id} no existe en Redis.")
\ No newline at end of file
+        print(f"[CronManager] El trabajo con ID {job_id} no existe en Redis.")
+    return job
+
+
+async def acquire_job_lock(job_id: str, token: str, ttl_seconds: float):
+    return bool(await r.set(lock_key(job_id), token, nx=True, px=max(int(ttl_seconds * 1000), 1)))
+
+async def _if_lock_owner(job_id: str, token: str, apply):
+    # Comprobar y modificar en una transacción (WATCH): solo actúa el dueño del lock
+    key = lock_key(job_id)
+    async with r.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            if await pipe.get(key) != token:
+                await pipe.unwatch()
+                return False
+            pipe.multi()
+            apply(pipe, key)
+            await pipe.execute()
+            return True
+        except WatchError:
+            return False
+
+async def extend_job_lock(job_id: str, token: str, ttl_seconds: float):
+    return await _if_lock_owner(job_id, token, lambda pipe, key: pipe.pexpire(key, max(int(ttl_seconds * 1000), 1)))
+
+async def release_job_lock(job_id: str, token: str):
+    return await _if_lock_owner(job_id, token, lambda pipe, key: pipe.delete(key))
+
+async def save_last_runs(last_runs: dict):
+    # job_id -> epoch del último disparo, en un solo HSET
+    if last_runs:
+        await r.hset(SCHEDULE_LAST_RUN_KEY, mapping={job_id: repr(ts) for job_id, ts in last_runs.items()})
+
+async def get_last_runs():
+    return {job_id: float(ts) for job_id, ts in (await r.hgetall(SCHEDULE_LAST_RUN_KEY)).items()}
+
+async def save_execution(record: dict, ttl_seconds: int):
+    await r.set(execution_key(record["id"]), json.dumps(record, default=str), ex=ttl_seconds)
+
+async def get_execution(execution_id: str):
+    data = await r.get(execution_key(execution_id))
+    return json.loads(data) if data else None
+
+# ========== MIGRACIÓN ==========
+def _parse_response_key(key: str):
+    # cronjob_response:{job_id}:{timestamp ISO} y cronmanager_crons:{job_id}:{timestamp ISO};
+    # el timestamp contiene ':'
+    _, job_id, timestamp = key.split(":", 2)
+    try:
+        score = datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        score = 0
+    return job_id, timestamp, score
+
+async def migrate_keyspace():
+    """Migraciones únicas del esquema: claves sueltas a los índices (2), jobs como HASH (3)
+    e índices secundarios por etiqueta, dueño, host y pausa (4); en 5 los pausados pasan de SET a ZSET."""
+    version = int(await r.get(SCHEMA_VERSION_KEY) or 0)
+    if version >= SCHEMA_VERSION:
+        return
+    if version < 2:
+        await _migrate_to_indexes()
+    if version < 3:
+        await _migrate_jobs_to_hashes()
+    if version == 4:
+        await r.delete(PAUSED_KEY)  # SET del esquema 4: se reconstruye como ZSET
+    await _build_secondary_indexes()
+    await r.set(SCHEMA_VERSION_KEY, SCHEMA_VERSION)
+
+async def _migrate_to_indexes():
+    print("[Redis] Migrando claves existentes a los índices...")
+    indexed = 0
+    batch = []
+    async for key in r.scan_iter(match="cronjob:*", count=SCAN_BATCH_SIZE):
+        batch.append(key.split(":", 1)[1])
+        if len(batch) >= SCAN_BATCH_SIZE:
+            await r.zadd(JOB_INDEX_KEY, {job_id: 0 for job_id in batch})
+            indexed += len(batch)
+            batch = []
+    if batch:
+        await r.zadd(JOB_INDEX_KEY, {job_id: 0 for job_id in batch})
+        indexed += len(batch)
+
+    # Respuestas de /run (cronjob_response:*) y de las ejecuciones programadas
+    # (cronmanager_crons:*) pasan al mismo historial por job
+    moved = 0
+    for pattern in ("cronjob_response:*", "cronmanager_crons:*"):
+        keys = []
+        async for key in r.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+            keys.append(key)
+            if len(keys) >= SCAN_BATCH_SIZE:
+                moved += await _move_responses(keys)
+                keys = []
+        if keys:
+            moved += await _move_responses(keys)
+
+    print(f"[Redis] Migración completada: {indexed} jobs indexados, {moved} respuestas movidas")
+
+async def _migrate_jobs_to_hashes():
+    # Esquema 3: cada cronjob:{id} pasa de JSON entero a HASH. MGET devuelve None
+    # para las claves que ya son HASH, así la migración se puede repetir sin riesgo
+    converted = 0
+    total = await r.zcard(JOB_INDEX_KEY)
+    for start in range(0, total, SCAN_BATCH_SIZE):
+        job_ids = await r.zrange(JOB_INDEX_KEY, start, start + SCAN_BATCH_SIZE - 1)
+        values = await r.mget([job_key(job_id) for job_id in job_ids])
+        async with r.pipeline(transaction=True) as pipe:
+            for job_id, data in zip(job_ids, values):
+                if data is None:
+                    continue
+                try:
+                    job = json.loads(data)
+                except json.JSONDecodeError:
+                    print(f"[Redis] Job {job_id} con JSON inválido, no se migra")
+                    continue
+                job.setdefault("id", job_id)
+                job.setdefault("paused", False)
+                pipe.delete(job_key(job_id))
+                pipe.hset(job_key(job_id), mapping=_encode_job(job))
+                converted += 1
+            await pipe.execute()
+    print(f"[Redis] Migración a HASH completada: {converted} jobs convertidos")
+
+async def _build_secondary_indexes():
+    # Esquemas 4 y 5: índices de los jobs existentes (ZADD es idempotente)
+    total = await r.zcard(JOB_INDEX_KEY)
+    for start in range(0, total, SCAN_BATCH_SIZE):
+        job_ids = await r.zrange(JOB_INDEX_KEY, start, start + SCAN_BATCH_SIZE - 1)
+        async with r.pipeline(transaction=False) as pipe:
+            for fields in await _hgetall_many(job_ids):
+                job = _decode_job(fields)
+                if job is not None:
+                    _write_indexes(pipe, job)
+            await pipe.execute()
+    print(f"[Redis] Índices secundarios construidos para {total} jobs")
+
+async def _move_responses(keys):
+    values = await r.mget(keys)
+    async with r.pipeline(transaction=False) as pipe:
+        for key, data in zip(keys, values):
+            if data is None:
+                continue
+            job_id, timestamp, score = _parse_response_key(key)
+            try:
+                response = json.loads(data)
+            except json.JSONDecodeError:
+                print(f"Error decodificando respuesta en clave {key}")
+                continue
+            entry = json.dumps({"timestamp": timestamp, "data": response})
+            pipe.zadd(responses_key(job_id), {entry: score})
+        pipe.delete(*keys)
+        await pipe.execute()
+    return len(keys)
@@ -0,0 +1,165 @@
+import os
+import re
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+from uuid import uuid4
+
+from config import TEMPLATE_ENV_PREFIX, TEMPLATE_ENV_ALLOWLIST
+
+# Petición HTTP de un job a partir de su script_path:
+#
+#   {"url": "https://api/x", "method": "POST", "headers": {...}, "params": {...},
+#    "json": {...} | "form": {...} | "body": "texto", "timeout": 10}
+#
+# Cualquier texto (url, valores de cabeceras, parámetros y cuerpo) admite los
+# marcadores {{now}}, {{timestamp}}, {{uuid}}, {{job_id}} y {{env.NOMBRE}}. La
+# plantilla se compila una vez al programar el job: job_id y los secretos del
+# entorno se sustituyen ya, y en cada disparo solo se rellenan los dinámicos.
+# {{env.NOMBRE}} solo lee variables con el prefijo TEMPLATE_ENV_PREFIX o incluidas
+# en TEMPLATE_ENV_ALLOWLIST: la API no tiene autenticación y cualquier job podría
+# enviar a su destino el resto del entorno (contraseñas de Redis, MySQL...).
+
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+BODY_FIELDS = ("json", "form", "body")
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([\w.]+)\s*\}\}")
+
+# Marcadores que cambian en cada disparo (un mismo valor para toda la petición)
+_DYNAMIC = {
+    "now": lambda: datetime.now(timezone.utc).isoformat(),
+    "timestamp": lambda: str(int(time.time())),
+    "uuid": lambda: str(uuid4()),
+}
+
+
+class _Text:
+    # Texto con marcadores dinámicos: [literal, nombre, literal, nombre, ..., literal]
+    __slots__ = ("parts",)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def render(self, values):
+        return "".join(part if i % 2 == 0 else values[part] for i, part in enumerate(self.parts))
+
+
+def _static_value(name, job_id):
+    if name == "job_id":
+        return str(job_id)
+    if name.startswith("env."):
+        variable = name[4:]
+        if not (TEMPLATE_ENV_PREFIX and variable.startswith(TEMPLATE_ENV_PREFIX)) \
+                and variable not in TEMPLATE_ENV_ALLOWLIST:
+            raise ValueError(f"Variable de entorno {variable} no permitida en plantillas "
+                             f"(prefijo {TEMPLATE_ENV_PREFIX} o TEMPLATE_ENV_ALLOWLIST)")
+        if variable not in os.environ:
+            raise ValueError(f"Variable de entorno {variable} no definida (marcador {{{{{name}}}}})")
+        return os.environ[variable]
+    raise ValueError(f"Marcador desconocido {{{{{name}}}}}")
+
+
+def _compile_value(value, job_id, dynamic):
+    if isinstance(value, dict):
+        return {key: _compile_value(item, job_id, dynamic) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_compile_value(item, job_id, dynamic) for item in value]
+    if not isinstance(value, str) or "{{" not in value:
+        return value
+
+    parts = [""]
+    position = 0
+    for match in _PLACEHOLDER.finditer(value):
+        parts[-1] += value[position:match.start()]
+        position = match.end()
+        name = match.group(1)
+        if name in _DYNAMIC:
+            dynamic.add(name)
+            parts += [name, ""]
+        else:
+            parts[-1] += _static_value(name, job_id)
+    parts[-1] += value[position:]
+    return parts[0] if len(parts) == 1 else _Text(parts)
+
+
+def _render(value, values):
+    if isinstance(value, _Text):
+        return value.render(values)
+    if isinstance(value, dict):
+        return {key: _render(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_render(item, values) for item in value]
+    return value
+
+
+class CompiledRequest:
+    """Petición lista para enviar con el cliente compartido.
+
+    display_url es la url tal como se escribió (sin secretos sustituidos) y es
+    la que se usa en logs y en el historial de respuestas.
+    """
+
+    def __init__(self, method, url, display_url, options, timeout, dynamic):
+        self.method = method
+        self.url = url
+        self.display_url = display_url
+        self.options = options
+        self.timeout = timeout
+        self.dynamic = tuple(sorted(dynamic))
+
+    def render(self):
+        # (url, kwargs de httpx) del disparo; sin marcadores dinámicos no se copia nada
+        if not self.dynamic:
+            return self.url, self.options
+        values = {name: _DYNAMIC[name]() for name in self.dynamic}
+        return _render(self.url, values), _render(self.options, values)
+
+
+def compile_request(script_path, job_id=None):
+    """Valida script_path y compila su petición. Lanza ValueError si la definición no es válida."""
+    if not isinstance(script_path, dict) or not isinstance(script_path.get("url"), str):
+        raise ValueError("script_path debe ser un diccionario con una clave 'url'")
+    job_id = job_id or script_path.get("job_id", "unknown")
+
+    method = str(script_path.get("method") or "GET").upper()
+    if method not in METHODS:
+        raise ValueError(f"Método HTTP no soportado: {method}")
+    bodies = [field for field in BODY_FIELDS if script_path.get(field) is not None]
+    if len(bodies) > 1:
+        raise ValueError(f"Solo se admite uno de {', '.join(BODY_FIELDS)}; recibido {', '.join(bodies)}")
+
+    options = {}
+    for field, option in (("headers", "headers"), ("params", "params"), ("form", "data")):
+        value = script_path.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, dict):
+            raise ValueError(f"{field} debe ser un diccionario")
+        options[option] = {str(key): value[key] if isinstance(value[key], (str, list)) else str(value[key])
+                           for key in value}
+    if script_path.get("json") is not None:
+        options["json"] = script_path["json"]
+    if script_path.get("body") is not None:
+        if not isinstance(script_path["body"], str):
+            raise ValueError("body debe ser texto (para un objeto usa json)")
+        options["content"] = script_path["body"]
+
+    timeout = script_path.get("timeout")
+    if timeout is not None:
+        try:
+            timeout = float(timeout)
+        except (TypeError, ValueError):
+            raise ValueError(f"timeout debe ser un número de segundos; recibido {timeout!r}")
+        if timeout <= 0:
+            raise ValueError("timeout debe ser mayor que 0")
+
+    # httpx reemplaza la query de la url por params: la de la url se incorpora a params
+    url = script_path["url"]
+    if "params" in options and "?" in url:
+        url, query = url.split("?", 1)
+        options["params"] = {**dict(parse_qsl(query, keep_blank_values=True)), **options["params"]}
+
+    dynamic = set()
+    url = _compile_value(url, job_id, dynamic)
+    options = _compile_value(options, job_id, dynamic)
+    return CompiledRequest(method, url, script_path["url"], options, timeout, dynamic)
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime
+
+import metrics
+from sinks import RedisSink, build_sinks
+from config import RESULT_QUEUE_SIZE, RESULT_BATCH_SIZE, RESULT_FLUSH_INTERVAL, RESULT_SINKS
+
+# Escritura diferida de resultados: las ejecuciones encolan su resultado y una
+# tarea de fondo lo vuelca en lotes a los destinos configurados (RESULT_SINKS).
+# La cola es acotada; si se llena, submit() espera (backpressure) en vez de perder datos.
+
+_queue = None
+_task = None
+_sinks = [RedisSink()]
+stats = {"written": 0, "batches": 0, "errors": 0}
+
+metrics.Callback("cronmanager_result_queue_depth", "Resultados pendientes de escribir",
+                 lambda: _queue.qsize() if _queue else 0)
+metrics.Callback("cronmanager_results_written_total", "Resultados escritos por el writer",
+                 lambda: stats["written"], "counter")
+metrics.Callback("cronmanager_result_batches_total", "Lotes escritos por el writer",
+                 lambda: stats["batches"], "counter")
+
+
+async def submit(job_id, response, max_entries=None, max_age_seconds=None, compression=None, compression_level=None):
+    record = {
+        "job_id": job_id,
+        "response": response,
+        "timestamp": datetime.now(),
+        "max_entries": max_entries,
+        "max_age_seconds": max_age_seconds,
+        "compression": compression,  # Solo se aplica al historial en Redis
+        "compression_level": compression_level,
+    }
+    if _task is None:
+        # Writer no iniciado (p. ej. sin Redis al arrancar): escritura directa
+        await _flush([record])
+        return
+    await _queue.put(record)
+
+
+async def _flush(batch):
+    # Todos los destinos reciben el lote en paralelo; el fallo de uno no afecta a los demás
+    results = await asyncio.gather(*(sink.write_many(batch) for sink in _sinks), return_exceptions=True)
+    for sink, result in zip(_sinks, results):
+        if isinstance(result, Exception):
+            stats["errors"] += 1
+            print(f"[ResultWriter] Error escribiendo lote de {len(batch)} resultados en {sink.name}: {result}")
+    stats["written"] += len(batch)
+    stats["batches"] += 1
+
+
+_STOP = object()  # Marca de fin en la cola para el apagado ordenado
+
+
+async def _collect_batch():
+    # Espera el primer resultado y junta más hasta llenar el lote o agotar el intervalo.
+    # Devuelve (lote, detener)
+    first = await _queue.get()
+    if first is _STOP:
+        return [], True
+    batch = [first]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RESULT_FLUSH_INTERVAL
+    while len(batch) < RESULT_BATCH_SIZE:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            record = await asyncio.wait_for(_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        if record is _STOP:
+            return batch, True
+        batch.append(record)
+    return batch, False
+
+
+async def _run():
+    while True:
+        batch, stop_requested = await _collect_batch()
+        if batch:
+            await _flush(batch)
+        if stop_requested:
+            return
+
+
+async def start():
+    global _queue, _task, _sinks
+    _sinks = await build_sinks(RESULT_SINKS)
+    _queue = asyncio.Queue(maxsize=RESULT_QUEUE_SIZE)
+    _task = asyncio.create_task(_run())
+    print(f"[ResultWriter] Iniciado (lote={RESULT_BATCH_SIZE}, intervalo={RESULT_FLUSH_INTERVAL}s, "
+          f"cola={RESULT_QUEUE_SIZE})")
+
+
+async def stop():
+    # Apagado ordenado: la marca de fin va detrás de lo pendiente, así se vuelca todo
+    global _task
+    if _task is None:
+        return
+    pending = _queue.qsize()
+    await _queue.put(_STOP)
+    await _task
+    _task = None
+    for sink in _sinks:
+        await sink.close()
+    print(f"[ResultWriter] Detenido ({pending} resultados volcados al apagar)")
@@ -0,0 +1,57 @@
+import random
+
+from config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BACKOFF_SECONDS,
+    RETRY_BACKOFF_MAX_SECONDS,
+    RETRY_STATUS_CODES,
+    RETRY_ATTEMPT_TIMEOUT,
+    job_setting,
+)
+
+# Campos opcionales del job que sobrescriben la política global de reintentos
+FIELDS = ("retry_max_attempts", "retry_backoff_seconds", "retry_backoff_max_seconds",
+          "retry_status_codes", "timeout_seconds")
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts, backoff_seconds, backoff_max_seconds, status_codes, timeout):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.status_codes = frozenset(status_codes)
+        self.timeout = timeout
+
+    def retries_status(self, status_code):
+        return status_code in self.status_codes
+
+    def delay(self, attempt, retry_after=None):
+        """Espera antes del siguiente intento: backoff exponencial con jitter completo.
+
+        Si el destino indicó Retry-After se respeta, sin pasar del máximo configurado.
+        """
+        ceiling = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** attempt)
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max_seconds))
+        return delay
+
+
+def policy_for(job):
+    job = job or {}
+    return RetryPolicy(
+        job_setting(job, "retry_max_attempts", RETRY_MAX_ATTEMPTS),
+        job_setting(job, "retry_backoff_seconds", RETRY_BACKOFF_SECONDS),
+        job_setting(job, "retry_backoff_max_seconds", RETRY_BACKOFF_MAX_SECONDS),
+        job_setting(job, "retry_status_codes", RETRY_STATUS_CODES),
+        job_setting(job, "timeout_seconds", RETRY_ATTEMPT_TIMEOUT),
+    )
+
+
+def retry_after_of(response):
+    # Solo la forma en segundos de la cabecera Retry-After
+    value = response.headers.get("Retry-After", "")
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
@@ -0,0 +1,59 @@
+import asyncio
+
+import redis_manager
+from config import SCHEDULE_STATE_FLUSH_SECONDS
+
+# Estado compacto del calendario en Redis: la hora programada del último disparo
+# de cada job. La siguiente se deduce del trigger, así que no hace falta guardar
+# el job serializado. Los disparos se anotan en memoria y se vuelcan con un solo
+# HSET cada SCHEDULE_STATE_FLUSH_SECONDS (y al apagar).
+
+_pending = {}
+_task = None
+
+
+def record(job_id, scheduled_run_time):
+    _pending[job_id] = scheduled_run_time.timestamp()
+
+
+def forget(job_ids):
+    # Jobs borrados: el siguiente volcado no debe volver a escribir su último disparo
+    for job_id in job_ids:
+        _pending.pop(job_id, None)
+
+
+async def flush():
+    global _pending
+    if not _pending or redis_manager.r is None:
+        return
+    batch, _pending = _pending, {}
+    try:
+        await redis_manager.save_last_runs(batch)
+    except Exception as e:
+        # Se reintenta en el siguiente volcado sin pisar disparos más recientes
+        for job_id, ts in batch.items():
+            _pending.setdefault(job_id, ts)
+        print(f"[ScheduleState] Error guardando el estado del calendario: {e}")
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(SCHEDULE_STATE_FLUSH_SECONDS)
+        await flush()
+
+
+def start():
+    global _task
+    _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await flush()
@@ -1,77 +1,265 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.combining import OrTrigger
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_REMOVED
+import hashlib
 import json
-import httpx
-from datetime import datetime
-from redis_manager import get_cronjob, r as redis_conn
-import asyncio
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import time
+from datetime import datetime, timedelta, timezone
+from redis_manager import get_cronjob
+from config import (
+    MAX_CONCURRENT_JOBS,
+    SCHEDULER_MISFIRE_GRACE_SECONDS,
+    SCHEDULER_COALESCE,
+    SCHEDULER_SPREAD_PHASES,
+    SCHEDULER_JITTER_SECONDS,
+    CATCH_UP_POLICY,
+    CATCH_UP_MAX_RUNS,
+)
+import asyncio
+import contextvars
+import httpx
+import circuit_breaker
+import http_client
+import job_cache
+import live_feed
+import metrics
+import overlap
+import payloads
+import rate_limit
+import request_template
+import result_writer
+import retry_policy
+import schedule_state
+
+# Los jobs se despachan como coroutines en el event loop de la app (uvicorn),
+# sin un hilo ni un event loop por disparo
+scheduler = AsyncIOScheduler(job_defaults={
+    "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS,
+    "coalesce": SCHEDULER_COALESCE,
+})
+
+# Límite global de ejecuciones simultáneas
+_semaphore = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+execution_stats = {"waiting": 0, "in_flight": 0}
+
+# Hueco del límite global que ocupa la ejecución en curso (por tarea); permite cederlo
+# mientras se espera el token del host sin que los demás hosts queden bloqueados
+_slot = contextvars.ContextVar("cronmanager_slot", default=None)
+
+metrics.Callback("cronmanager_executions_waiting", "Ejecuciones esperando un hueco de concurrencia",
+                 lambda: execution_stats["waiting"])
+metrics.Callback("cronmanager_executions_in_flight", "Ejecuciones en curso",
+                 lambda: execution_stats["in_flight"])
+
+def _on_job_submitted(event):
+    # Retraso entre la hora programada y el momento real del disparo
+    lag = (datetime.now(timezone.utc) - event.scheduled_run_times[-1]).total_seconds()
+    metrics.scheduling_lag.observe(max(lag, 0.0), metrics.job_label(event.job_id))
+    schedule_state.record(event.job_id, event.scheduled_run_times[-1])
+
+def _on_job_missed(event):
+    reason = "max_instances" if event.code == EVENT_JOB_MAX_INSTANCES else "missed"
+    metrics.misfires_total.inc(metrics.job_label(event.job_id), reason)
+
+# Definición con la que se programó cada job: (opciones del trigger, args, opciones de add_job).
+# Permite aplicar una edición tocando solo lo que cambió
+_definitions = {}
+
+def _on_job_removed(event):
+    _definitions.pop(event.job_id, None)
 
-scheduler = BackgroundScheduler()
+scheduler.add_listener(_on_job_submitted, EVENT_JOB_SUBMITTED)
+scheduler.add_listener(_on_job_removed, EVENT_JOB_REMOVED)
+scheduler.add_listener(_on_job_missed, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
 
-def run_script(script_path):
-    # Ejecuta el job como coroutine y devuelve el resultado
-    result = asyncio.run(run_async_script(script_path))
-    return result
+async def execute_job(script_path):
+    # Punto de entrada de todas las ejecuciones (programadas y manuales)
+    job_id = _job_id_of(script_path)
+    job_data = None
+    if job_id != "unknown":
+        # La metadata sale de la caché en memoria; solo se lee Redis si el job no está en ella
+        job_data = job_cache.get(job_id) or await get_cronjob(job_id)
 
-async def run_async_script(script_path):
-    retries = 3
-    for attempt in range(retries):
+    # Política de solapamiento del job (antes de ocupar un hueco del límite global)
+    ticket = await overlap.acquire(job_id, job_data)
+    if ticket is None:
+        metrics.executions_total.inc(metrics.job_label(job_id), "skipped")
+        live_feed.publish("execution", job_id, result="skipped", reason="overlap")
+        return None
+    try:
+        queued_at = time.perf_counter()
+        execution_stats["waiting"] += 1
         try:
-            data = validate_script_path(script_path)  # Validamos y obtenemos el script_path
-            
-            job_id = data.get("job_id", "unknown")
-            if job_id != "unknown":
-                job_data = get_cronjob(job_id)
-                if job_data and job_data.get("paused"):
-                    print(f"[CronManager] Job '{job_id}' está pausado. No se ejecutará.")
-                    return None
-            
-            url = data["url"]
-            method = data.get("method", "GET").upper()
-            
-            print(f"[CronManager] Ejecutando: {method} {url}")
-            
-            async with httpx.AsyncClient() as client:
-                if method == "POST":
-                    print(f"[CronManager] Realizando POST a la URL: {url}")
-                    res = await client.post(url)
-                else:
-                    print(f"[CronManager] Realizando GET a la URL: {url}")
-                    res = await client.get(url)
-            
-            if not res.text.strip():
-                raise ValueError("Respuesta vacía del servidor")
-            
-            if 'application/json' in res.headers.get('Content-Type', ''):
-                try:
-                    response_data = res.json()
-                except ValueError:
-                    raise ValueError(f"Respuesta no válida JSON: {res.text}")
-            else:
-                response_data = {
-                    "url": url,
-                    "method": method,
-                    "status_code": res.status_code,
-                    "response_text": res.text,
-                    "content_type": res.headers.get('Content-Type', 'unknown'),
-                    "timestamp": datetime.now().isoformat()
-                }
-            
-            if job_id != "unknown":
-                key = f"cronmanager_crons:{job_id}:{datetime.now().isoformat()}"
-                redis_conn.set(key, json.dumps(response_data))
-                print(f"[CronManager] Resultado guardado en Redis bajo la llave {key}")
-            
-            return response_data  # Devolvemos los datos de la respuesta
-        
+            await _semaphore.acquire()
+        finally:
+            execution_stats["waiting"] -= 1
+        metrics.queue_wait.observe(time.perf_counter() - queued_at)
+        execution_stats["in_flight"] += 1
+        slot = {"held": True}
+        slot_token = _slot.set(slot)
+        started = time.perf_counter()
+        result = "failure"
+        error = None
+        try:
+            response = await run_async_script(script_path, job_data)
+            result = "success" if response is not None else "skipped"
+            return response
         except Exception as e:
-            if attempt < retries - 1:
-                print(f"[CronManager] Intento fallido, reintentando ({attempt+1}/3)...")
-                time.sleep(2)  # Espera entre intentos
+            error = str(e)
+            raise
+        finally:
+            _slot.reset(slot_token)
+            if slot["held"]:
+                execution_stats["in_flight"] -= 1
+                _semaphore.release()
+            metrics.executions_total.inc(metrics.job_label(job_id), result)
+            # Solo el resumen: el cuerpo se consulta en /executions/{id} o /cronjob/{id}/responses
+            live_feed.publish("execution", job_id, result=result, status_code=slot.get("status_code"),
+                              error=error, duration_seconds=round(time.perf_counter() - started, 3))
+    finally:
+        await overlap.release(ticket)
+
+async def _wait_rate_limit(url):
+    # Espera por el límite del host sin ocupar el hueco global: se libera y se vuelve
+    # a pedir al terminar, así los jobs de un host limitado no frenan a los demás
+    wait = rate_limit.reserve(url)
+    if wait <= 0:
+        return
+    slot = _slot.get()
+    if slot is None or not slot["held"]:
+        await asyncio.sleep(wait)
+        return
+    slot["held"] = False
+    execution_stats["in_flight"] -= 1
+    _semaphore.release()
+    await asyncio.sleep(wait)
+    execution_stats["waiting"] += 1
+    try:
+        await _semaphore.acquire()
+    finally:
+        execution_stats["waiting"] -= 1
+    slot["held"] = True
+    execution_stats["in_flight"] += 1
+
+# Errores de transporte que merecen otro intento (el destino no llegó a responder)
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+# job_data aún no consultado (distinto de None, que es "el job no existe")
+_NOT_LOADED = object()
+
+async def run_async_script(script_path, job_data=_NOT_LOADED):
+    data = validate_script_path(script_path)  # Validamos y obtenemos el script_path
+    
+    job_id = data.get("job_id", "unknown")
+    if job_data is _NOT_LOADED:
+        # execute_job ya consultó la caché y Redis; solo las llamadas directas leen aquí
+        job_data = (job_cache.get(job_id) or await get_cronjob(job_id)) if job_id != "unknown" else None
+    if job_data and job_data.get("paused"):
+        print(f"[CronManager] Job '{job_id}' está pausado. No se ejecutará.")
+        return None
+    
+    # Petición compilada al programar el job; las ejecuciones manuales la compilan aquí.
+    # Los marcadores dinámicos se rellenan una vez por disparo (iguales en todos los intentos)
+    request = data.get("request") or request_template.compile_request(data)
+    url, options = request.render()
+    method = request.method
+    host = rate_limit.host_of(url)
+    policy = retry_policy.policy_for(job_data)
+    timeout = http_client.attempt_timeout(request.timeout if request.timeout is not None else policy.timeout)
+    
+    # Con el circuito del host abierto no se envía la petición (ni se reintenta)
+    if not circuit_breaker.allow(host):
+        print(f"[CronManager] Circuito abierto para {host}: se omite el job '{job_id}'")
+        return None
+    
+    error = None
+    for attempt in range(policy.max_attempts):
+        if attempt:
+            metrics.retries_total.inc(metrics.job_label(job_id))
+        
+        print(f"[CronManager] Ejecutando: {method} {request.display_url}")
+        
+        await _wait_rate_limit(url)  # Límite por host de destino (si está configurado)
+        retry_after = None
+        started = time.perf_counter()
+        try:
+            res = await http_client.request(method, url, timeout=timeout, **options)
+        except RETRYABLE_ERRORS as e:
+            circuit_breaker.record_failure(host)
+            error = e
+        else:
+            execution = _slot.get()
+            if execution is not None:
+                execution["status_code"] = res.status_code  # Para el evento del feed en vivo
+            metrics.http_latency.observe(time.perf_counter() - started, metrics.job_label(job_id))
+            metrics.response_size.observe(len(res.content), metrics.job_label(job_id))
+            if res.status_code >= 500:
+                circuit_breaker.record_failure(host)
             else:
-                print(f"[CronManager] Error final: {e}")
-                raise e  # Lanzamos el error si después de varios intentos falla
+                circuit_breaker.record_success(host)
+            if not policy.retries_status(res.status_code):
+                break
+            error = ValueError(f"Estado HTTP {res.status_code} de {request.display_url}")
+            retry_after = retry_policy.retry_after_of(res)
+        
+        if attempt < policy.max_attempts - 1 and not circuit_breaker.allow(host):
+            # Reintentos cortados por el circuito: sin esperar, la ejecución falla con el último error
+            print(f"[CronManager] Circuito abierto para {host}: no se reintenta el job '{job_id}' ({error})")
+            raise error
+        if attempt < policy.max_attempts - 1:
+            delay = policy.delay(attempt, retry_after)
+            print(f"[CronManager] Intento fallido ({error}), reintentando en {delay:.2f}s "
+                  f"({attempt+1}/{policy.max_attempts})...")
+            await asyncio.sleep(delay)  # Espera entre intentos sin bloquear el loop
+        else:
+            print(f"[CronManager] Error final: {error}")
+            raise error  # Lanzamos el error si después de varios intentos falla
+    
+    # Lo que se guarda depende del job: cuerpo completo o resumen, tope de tamaño y proyección JSON
+    _, _, _, codec, level = payloads.settings_for(job_data)
+    response_data = payloads.shape(job_data, res, request.display_url, method, time.perf_counter() - started)
+    
+    if job_id != "unknown":
+        # Historial acotado por job: una sola escritura por ejecución, diferida y por lotes
+        await result_writer.submit(
+            job_id,
+            response_data,
+            max_entries=(job_data or {}).get("max_responses"),
+            max_age_seconds=(job_data or {}).get("response_max_age_seconds"),
+            compression=codec,
+            compression_level=level,
+        )
+    
+    return response_data  # Devolvemos los datos de la respuesta
+
+# Membresía del cluster (None = instancia única, posee todos los jobs)
+cluster = None
+
+def set_cluster(membership):
+    global cluster
+    cluster = membership
+
+def owns(job_id):
+    return cluster is None or cluster.owns(job_id)
+
+async def run_scheduled_job(script_path, guard_seconds=None):
+    # Disparo programado: en modo cluster solo lo ejecuta la instancia dueña del job,
+    # y la reserva en Redis evita el doble disparo mientras se rebalancea
+    if cluster is not None:
+        job_id = _job_id_of(script_path)
+        if not cluster.owns(job_id):
+            metrics.misfires_total.inc(metrics.job_label(job_id), "not_owner")
+            return None
+        if guard_seconds and not await cluster.claim_fire(job_id, guard_seconds):
+            metrics.misfires_total.inc(metrics.job_label(job_id), "duplicate")
+            return None
+    return await execute_job(script_path)
+
+def _job_id_of(script_path):
+    return script_path.get("job_id", "unknown") if isinstance(script_path, dict) else "unknown"
 
 def validate_script_path(script_path):
     if isinstance(script_path, str):
@@ -84,60 +272,435 @@ def validate_script_path(script_path):
                 raise ValueError("El script_path no es válido ni como JSON ni como URL.")
     return script_path  # Ya es un dict
 
-def add_cronjob_to_scheduler(job_id, script_path, interval_seconds):
-    # Asegurarnos de que script_path sea un diccionario
-    if isinstance(script_path, str):
-        script_path = validate_script_path(script_path)
-    
-    # Añadir el job_id al script_path para que run_script sepa a qué job pertenece
-    script_path_with_id = dict(script_path)  # Crear una copia para no modificar el original
-    script_path_with_id["job_id"] = job_id
+def scheduled_args(job_id, script_path):
+    """Definición del destino con su job_id y argumento del job en el scheduler.
+
+    El argumento lleva además la petición ya compilada (clave "request"), así
+    cada disparo solo rellena los marcadores dinámicos. ValueError si no es válida.
+    """
+    definition = dict(validate_script_path(script_path), job_id=job_id)
+    return definition, dict(definition, request=request_template.compile_request(definition, job_id))
+
+# Ancla fija para las fases: el desfase de cada job es el mismo tras cada reinicio y en cada instancia
+_PHASE_ANCHOR = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+def phase_offset(job_id, interval_seconds):
+    # Desfase determinista dentro del intervalo (resolución de milisegundos)
+    digest = int.from_bytes(hashlib.blake2b(str(job_id).encode(), digest_size=8).digest(), "big")
+    return (digest % max(int(interval_seconds * 1000), 1)) / 1000
+
+# Campos de la definición del job que determinan su trigger
+TRIGGER_FIELDS = ("interval_seconds", "cron", "timezone", "start_date", "end_date", "jitter_seconds")
+
+# Guarda anti doble disparo para los jobs cron (granularidad mínima de un minuto)
+CRON_GUARD_SECONDS = 30
+
+_CRON_WEEKDAYS = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")
+
+def trigger_options(job):
+    return {field: job.get(field) for field in TRIGGER_FIELDS}
+
+def _crontab_weekday(value):
+    # Día en numeración crontab (0-7, 0 y 7 = domingo) o por nombre ("mon")
+    if value.lower() in _CRON_WEEKDAYS:
+        return _CRON_WEEKDAYS.index(value.lower())
+    if value.isdigit() and int(value) <= 7:
+        return int(value) % 7
+    raise ValueError(f"Día de la semana no válido en la expresión cron: {value}")
+
+def _crontab_day_of_week(field):
+    # En crontab 0 (y 7) es domingo; APScheduler 3.x numera desde el lunes y no
+    # admite rangos que crucen el domingo ni pasos sobre nombres. Se expanden los
+    # rangos y pasos en numeración crontab a una lista explícita de nombres
+    days = set()
+    for item in field.split(","):
+        item, _, step = item.partition("/")
+        if step and not step.isdigit() or step == "0":
+            raise ValueError(f"Paso no válido en el día de la semana de la expresión cron: {field}")
+        if item == "*":
+            first, last = 0, 6
+        elif "-" in item:
+            first, last = (int(v) if v.isdigit() else _crontab_weekday(v) for v in item.split("-", 1))
+            if first > last or last > 7:
+                raise ValueError(f"Rango no válido en el día de la semana de la expresión cron: {item}")
+        else:
+            first = _crontab_weekday(item)
+            last = 6 if step else first
+        days.update(day % 7 for day in range(first, last + 1, int(step or 1)))
+    if len(days) == 7:
+        return "*"
+    return ",".join(_CRON_WEEKDAYS[day] for day in sorted(days))
+
+def build_trigger(job_id, options):
+    """Construye el trigger a partir de los campos de TRIGGER_FIELDS.
+
+    Un job es cron (expresión de 5 campos, con zona horaria y ventana
+    start_date/end_date opcionales) o de intervalo. Lanza ValueError si la
+    definición no es válida.
+    """
+    jitter = options.get("jitter_seconds")
+    jitter = SCHEDULER_JITTER_SECONDS if jitter is None else jitter
+    tz = options.get("timezone") or None
+    if tz is not None:
+        try:
+            tz = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Zona horaria desconocida: {tz}")
+    start_date = options.get("start_date") or None
+    end_date = options.get("end_date") or None
+
+    if options.get("cron"):
+        values = options["cron"].split()
+        if len(values) != 5:
+            raise ValueError(f"La expresión cron debe tener 5 campos; tiene {len(values)}")
+        minute, hour, day, month, day_of_week = values
+        day_of_week = _crontab_day_of_week(day_of_week)
+        window = dict(minute=minute, hour=hour, month=month, timezone=tz, start_date=start_date, end_date=end_date)
+        # Con día del mes y día de la semana restringidos crontab dispara si coincide
+        # cualquiera de los dos (OR); CronTrigger exige ambos, así que se combinan dos
+        if not day.startswith("*") and day_of_week != "*":
+            return OrTrigger([CronTrigger(day=day, **window), CronTrigger(day_of_week=day_of_week, **window)],
+                             jitter=jitter or None)
+        return CronTrigger(day=day, day_of_week=day_of_week, jitter=jitter or None, **window)
+
+    interval_seconds = options.get("interval_seconds")
+    if not interval_seconds or interval_seconds <= 0:
+        raise ValueError("El job necesita interval_seconds (> 0) o una expresión cron")
+    # Los jobs con el mismo intervalo se reparten a lo largo de él en vez de dispararse
+    # todos en el mismo instante tras un reinicio; el jitter añade una variación aleatoria
+    if start_date is None and SCHEDULER_SPREAD_PHASES:
+        start_date = _PHASE_ANCHOR + timedelta(seconds=phase_offset(job_id, interval_seconds))
+    return IntervalTrigger(seconds=interval_seconds, start_date=start_date, end_date=end_date,
+                           timezone=tz, jitter=jitter or None)
+
+def guard_seconds_for(options):
+    interval_seconds = options.get("interval_seconds")
+    if options.get("cron") or not interval_seconds:
+        return CRON_GUARD_SECONDS
+    return interval_seconds / 2
+
+def job_options(job):
+    # Opciones de add_job propias del job: coalescencia de disparos perdidos y tope de instancias
+    coalesce = job.get("coalesce")
+    return {
+        "coalesce": SCHEDULER_COALESCE if coalesce is None else coalesce,
+        "max_instances": overlap.max_instances_for(job),
+    }
+
+def add_cronjob_to_scheduler(job_id, script_path, interval_seconds=None, jitter_seconds=None, **schedule):
+    # schedule admite los demás campos de TRIGGER_FIELDS (cron, timezone, start_date, end_date)
+    # y los de overlap.FIELDS (política de solapamiento y coalescencia)
+    options = trigger_options(dict(schedule, interval_seconds=interval_seconds, jitter_seconds=jitter_seconds))
+
+    # Copia del script_path con el job_id (para que execute_job sepa a qué job pertenece)
+    # y la petición compilada una sola vez
+    script_path_with_id, args = scheduled_args(job_id, script_path)
     
-    print(f"[CronManager] Añadiendo job {job_id} al scheduler con interval={interval_seconds}s")
+    if not owns(job_id):
+        print(f"[Cluster] Job {job_id} pertenece a otra instancia, no se añade al scheduler")
+        return
+
+    trigger = build_trigger(job_id, options)
+    add_options = job_options(schedule)
+    print(f"[CronManager] Añadiendo job {job_id} al scheduler con trigger={trigger}")
     
-    # Asegúrate de que el scheduler está inicializado y funcionando
+    # Si el scheduler aún no arrancó, el job queda pendiente y se registra al
+    # llamar a start() desde el evento de startup (necesita el event loop de la app)
     if not scheduler.running:
-        print("[CronManager] Iniciando scheduler porque no estaba ejecutándose")
-        scheduler.start()
+        print("[CronManager] Scheduler detenido: el job se registrará al iniciarlo")
     
     # Eliminar el job anterior si existe
     if scheduler.get_job(job_id):
         scheduler.remove_job(job_id)
         print(f"[CronManager] Job anterior con ID {job_id} eliminado para reemplazarlo")
     
-    # Añadir el job con el intervalo especificado
+    # Añadir el job con su trigger
     scheduler.add_job(
-        run_script,
-        trigger=IntervalTrigger(seconds=interval_seconds),
+        run_scheduled_job,
+        trigger=trigger,
         id=str(job_id),
-        args=[script_path_with_id],
-        replace_existing=True
+        args=[args],
+        kwargs={"guard_seconds": guard_seconds_for(options)},
+        replace_existing=True,
+        **add_options
     )
+    _definitions[job_id] = (options, script_path_with_id, add_options)
     
     # Verificar que el job se ha añadido correctamente
     job = scheduler.get_job(job_id)
     if job:
         print(f"[CronManager] Job {job_id} añadido correctamente al scheduler")
-        print(f"[CronManager] Próxima ejecución: {job.next_run_time}")
+        print(f"[CronManager] Próxima ejecución: {getattr(job, 'next_run_time', 'pendiente')}")
     else:
         print(f"[CronManager] Error: No se pudo añadir el job {job_id} al scheduler")
-        
-def load_jobs_from_redis():
-    from redis_manager import get_all_cronjobs
-    jobs = get_all_cronjobs()
-    print(f"[CronManager] Cargando {len(jobs)} trabajos desde Redis...")
-    
-    for job in jobs:
+
+def schedule_job(job):
+    # Programa un job a partir de su definición guardada
+    overlap_options = {field: job.get(field) for field in overlap.FIELDS}
+    add_cronjob_to_scheduler(job["id"], job["script_path"], **trigger_options(job), **overlap_options)
+
+def update_scheduled_job(job):
+    """Aplica una definición editada al job ya programado sin quitarlo y volver a añadirlo.
+
+    Solo se llama a modify_job si cambió el destino o las opciones de ejecución,
+    y a reschedule_job si cambió el trigger. Devuelve la lista de partes tocadas.
+    """
+    job_id = job["id"]
+    if not owns(job_id):
+        return []
+    existing = scheduler.get_job(job_id)
+    if existing is None:
         if job.get("paused", False):
-            print(f"[CronManager] Job '{job['id']}' está pausado, no se añadirá al scheduler")
+            return []
+        schedule_job(job)
+        return ["added"]
+
+    options = trigger_options(job)
+    script_path_with_id = dict(validate_script_path(job["script_path"]), job_id=job_id)
+    add_options = job_options(job)
+    previous = _definitions.get(job_id, (None, None, None))
+
+    changed = []
+    modifications = {}
+    if previous[1] != script_path_with_id:
+        modifications["args"] = [scheduled_args(job_id, script_path_with_id)[1]]
+        changed.append("target")
+    if previous[2] != add_options:
+        modifications.update(add_options)
+        changed.append("options")
+    if previous[0] != options:
+        modifications["kwargs"] = {"guard_seconds": guard_seconds_for(options)}
+    if modifications:
+        scheduler.modify_job(job_id, **modifications)
+    if previous[0] != options:
+        scheduler.reschedule_job(job_id, trigger=build_trigger(job_id, options))
+        changed.append("trigger")
+    _definitions[job_id] = (options, script_path_with_id, add_options)
+
+    # reschedule_job reanuda el job: el estado de pausa se aplica al final
+    is_paused = getattr(existing, "next_run_time", 0) is None
+    if job.get("paused", False) and (not is_paused or "trigger" in changed):
+        scheduler.pause_job(job_id)
+        changed.append("paused")
+    elif not job.get("paused", False) and is_paused and "trigger" not in changed:
+        scheduler.resume_job(job_id)
+        changed.append("resumed")
+    return changed
+
+def set_jobs_paused(jobs, paused):
+    # Pausa o reanuda un lote; los reanudados que no estaban programados se registran en bloque
+    missing = []
+    for job in jobs:
+        job_id = job["id"]
+        if not owns(job_id):
             continue
-        
-        print(f"[CronManager] Añadiendo job '{job['name']}' (ID: {job['id']}) al scheduler")
-        add_cronjob_to_scheduler(job["id"], job["script_path"], job["interval_seconds"])
+        if scheduler.get_job(job_id) is None:
+            if not paused:
+                missing.append(job)
+        elif paused:
+            scheduler.pause_job(job_id)
+        else:
+            scheduler.resume_job(job_id)
+    if missing:
+        register_jobs(missing)
+
+def remove_jobs(job_ids):
+    for job_id in job_ids:
+        if scheduler.get_job(job_id):
+            scheduler.remove_job(job_id)
+
+def next_run_time(job_id):
+    # Próxima ejecución efectiva (con desfase y jitter) o None si el job no está programado aquí
+    job = scheduler.get_job(job_id)
+    next_run = getattr(job, "next_run_time", None) if job else None
+    return next_run.isoformat() if next_run else None
+
+def describe_schedule(job):
+    job_id = job["id"]
+    options = trigger_options(job)
+    interval = options["interval_seconds"]
+    spread = SCHEDULER_SPREAD_PHASES and interval and not options["cron"] and not options["start_date"]
+    return {
+        "id": job_id,
+        **options,
+        "trigger": str(build_trigger(job_id, options)),
+        "phase_offset_seconds": phase_offset(job_id, interval) if spread else 0,
+        "jitter_seconds": SCHEDULER_JITTER_SECONDS if job.get("jitter_seconds") is None else job["jitter_seconds"],
+        "scheduled_here": scheduler.get_job(job_id) is not None,
+        "next_run_time": next_run_time(job_id),
+    }
+
+CATCH_UP_POLICIES = ("skip", "once", "all")
+
+catch_up_runs_total = metrics.Counter(
+    "cronmanager_catch_up_runs_total", "Ejecuciones de recuperación de disparos perdidos con la app detenida",
+    ("job_id",))
+
+# Ejecuciones de recuperación calculadas en register_jobs; se lanzan al iniciar el scheduler
+_catch_up = []
+_catch_up_tasks = set()
+
+def catch_up_settings(job):
+    policy = (job.get("catch_up") or CATCH_UP_POLICY).lower()
+    if policy not in CATCH_UP_POLICIES:
+        raise ValueError(f"catch_up debe ser uno de {', '.join(CATCH_UP_POLICIES)}; recibido '{policy}'")
+    max_runs = job.get("catch_up_max")
+    return policy, CATCH_UP_MAX_RUNS if max_runs is None else max_runs
+
+def plan_recovery(job, trigger, last_run, now):
+    """Devuelve (próximo disparo a conservar o None, disparos perdidos a recuperar).
+
+    El siguiente disparo tras last_run se calcula con el trigger: si aún no ha
+    llegado se conserva tal cual; si ya pasó, los perdidos se cuentan (hasta el
+    máximo que permite la política) y el trigger sigue desde ahora.
+    """
+    policy, max_runs = catch_up_settings(job)
+    next_run = trigger.get_next_fire_time(last_run, last_run)
+    if next_run is None:
+        return None, 0
+    if next_run > now:
+        return next_run, 0
+    limit = {"skip": 0, "once": 1, "all": max_runs}[policy]
+    missed = 0
+    last_missed = next_run
+    # Se cuenta uno más del límite solo para las métricas de descartados
+    while next_run is not None and next_run <= now and missed <= limit:
+        missed += 1
+        last_missed = next_run
+        next_run = trigger.get_next_fire_time(next_run, next_run)
+    runs = min(missed, limit)
+    if missed > runs:
+        metrics.misfires_total.inc(metrics.job_label(job["id"]), "downtime")
+    # Los perdidos quedan atendidos (recuperados o descartados): el último se anota
+    # como disparo para que el siguiente arranque no los vuelva a recuperar ni contar
+    schedule_state.record(job["id"], _last_fire_before(trigger, last_missed, now))
+    return None, runs
+
+def _last_fire_before(trigger, fire_time, now):
+    # Último disparo programado <= now a partir de uno perdido
+    if isinstance(trigger, IntervalTrigger):
+        return fire_time + int((now - fire_time) / trigger.interval) * trigger.interval
+    while True:
+        following = trigger.get_next_fire_time(fire_time, fire_time)
+        if following is None or following > now:
+            return fire_time
+        fire_time = following
+
+def register_jobs(jobs, last_runs=None):
+    """Registro masivo de jobs en el scheduler (arranque).
+
+    A diferencia de add_cronjob_to_scheduler no consulta ni elimina el job
+    previo ni imprime por job; con el scheduler aún detenido cada add_job solo
+    lo deja en la lista de pendientes. Con last_runs (job_id -> epoch del último
+    disparo) conserva el calendario anterior y prepara la recuperación de los
+    disparos perdidos según la política del job. Devuelve cuántos jobs se registraron.
+    """
+    now = datetime.now(timezone.utc)
+    last_runs = last_runs or {}
+    registered = 0
+    for job in jobs:
+        job_id = job["id"]
+        if job.get("paused", False) or not owns(job_id):
+            continue
+        options = trigger_options(job)
+        try:
+            script_path_with_id, args = scheduled_args(job_id, job["script_path"])
+            trigger = build_trigger(job_id, options)
+            add_options = job_options(job)
+            if job_id in last_runs:
+                last_run = datetime.fromtimestamp(last_runs[job_id], timezone.utc)
+                next_run, runs = plan_recovery(job, trigger, last_run, now)
+                if next_run is not None:
+                    add_options["next_run_time"] = next_run
+                if runs:
+                    _catch_up.append((args, runs))
+        except ValueError as e:
+            print(f"[CronManager] Job {job_id} con definición inválida, se omite: {e}")
+            continue
+        scheduler.add_job(
+            run_scheduled_job,
+            trigger=trigger,
+            id=str(job_id),
+            args=[args],
+            kwargs={"guard_seconds": guard_seconds_for(options)},
+            replace_existing=True,
+            **add_options
+        )
+        add_options.pop("next_run_time", None)
+        _definitions[job_id] = (options, script_path_with_id, add_options)
+        registered += 1
+    return registered
+
+def on_job_changed(action, job_id, job):
+    # Cambios publicados por otras instancias: en modo cluster la dueña del job
+    # lo programa o lo quita sin esperar al siguiente rebalanceo
+    if cluster is None:
+        return
+    existing = scheduler.get_job(job_id)
+    if action == "delete" or not owns(job_id):
+        if existing:
+            scheduler.remove_job(job_id)
+    elif job and existing:
+        update_scheduled_job(job)
+    elif job and not job.get("paused", False):
+        schedule_job(job)
+
+async def rebalance():
+    # Ajusta los jobs locales al reparto actual del cluster: añade los que ahora
+    # pertenecen a esta instancia y quita los que pasaron a otra
+    from redis_manager import get_all_cronjobs
+    jobs = await get_all_cronjobs()
+    added = removed = 0
+    for job in jobs:
+        job_id = job["id"]
+        existing = scheduler.get_job(job_id)
+        if not owns(job_id):
+            if existing:
+                scheduler.remove_job(job_id)
+                removed += 1
+        elif not existing and not job.get("paused", False):
+            try:
+                schedule_job(job)
+            except ValueError as e:
+                print(f"[Cluster] Job {job_id} con definición inválida, se omite: {e}")
+                continue
+            added += 1
+    if added or removed:
+        print(f"[Cluster] Rebalanceo: {added} jobs añadidos, {removed} jobs cedidos")
+
+async def _run_catch_up(script_path, runs):
+    # Los disparos perdidos de un mismo job se recuperan en orden, uno tras otro
+    job_id = _job_id_of(script_path)
+    for _ in range(runs):
+        catch_up_runs_total.inc(metrics.job_label(job_id))
+        try:
+            await execute_job(dict(script_path))
+        except Exception as e:
+            print(f"[CronManager] Error recuperando un disparo del job {job_id}: {e}")
+
+def _start_catch_up():
+    if not _catch_up:
+        return
+    total = sum(runs for _, runs in _catch_up)
+    print(f"[CronManager] Recuperando {total} disparos perdidos de {len(_catch_up)} jobs")
+    for script_path, runs in _catch_up:
+        task = asyncio.create_task(_run_catch_up(script_path, runs))
+        _catch_up_tasks.add(task)
+        task.add_done_callback(_catch_up_tasks.discard)
+    _catch_up.clear()
 
 def start():
     if not scheduler.running:
         scheduler.start()
         print("[CronManager] Scheduler iniciado correctamente")
     else:
-        print("[CronManager] El scheduler ya está en ejecución")
\ No newline at end of file
+        print("[CronManager] El scheduler ya está en ejecución")
+    _start_catch_up()
+
+async def shutdown():
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+        print("[CronManager] Scheduler detenido")
+    for task in list(_catch_up_tasks):
+        task.cancel()
+    await http_client.close_client()
@@ -0,0 +1,129 @@
+import json
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from aiomysql import Pool
+
+import redis_manager
+from config import (
+    get_storage,
+    FileStorage,
+    LOG_STORAGE_BACKEND,
+    LOG_STORAGE_NAME,
+    APP_LOG_FILE,
+)
+
+# Destinos de los resultados de las ejecuciones. Todos reciben lotes completos
+# desde result_writer, así cada backend usa su escritura masiva nativa.
+
+
+def _document(record):
+    return {
+        "job_id": record["job_id"],
+        "timestamp": record["timestamp"],
+        "data": record["response"],
+    }
+
+
+class ResultSink:
+    name = "sink"
+
+    async def write_many(self, records):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class RedisSink(ResultSink):
+    # Historial reciente y acotado por job (cronjob_responses:{job_id})
+    name = "redis"
+
+    async def write_many(self, records):
+        await redis_manager.save_cronjob_responses(records)
+
+
+class MongoSink(ResultSink):
+    name = "mongo"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def write_many(self, records):
+        await self.collection.insert_many([_document(record) for record in records], ordered=False)
+
+
+class MySQLSink(ResultSink):
+    name = "mysql"
+
+    def __init__(self, pool, table):
+        self.pool = pool
+        self.table = table
+        self._table_ready = False
+
+    async def _ensure_table(self, cur):
+        await cur.execute(
+            f"CREATE TABLE IF NOT EXISTS `{self.table}` ("
+            " id BIGINT AUTO_INCREMENT PRIMARY KEY,"
+            " job_id VARCHAR(64) NOT NULL,"
+            " timestamp DATETIME(6) NOT NULL,"
+            " data LONGTEXT,"
+            " INDEX idx_job_timestamp (job_id, timestamp))"
+        )
+        self._table_ready = True
+
+    async def write_many(self, records):
+        rows = [
+            (record["job_id"], record["timestamp"], json.dumps(record["response"]))
+            for record in records
+        ]
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                if not self._table_ready:
+                    await self._ensure_table(cur)
+                # aiomysql convierte executemany de un INSERT ... VALUES en un INSERT multi-fila
+                await cur.executemany(
+                    f"INSERT INTO `{self.table}` (job_id, timestamp, data) VALUES (%s, %s, %s)", rows
+                )
+
+    async def close(self):
+        self.pool.close()
+        await self.pool.wait_closed()
+
+
+class FileSink(ResultSink):
+    name = "file"
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def write_many(self, records):
+        documents = [_document(record) for record in records]
+        for document in documents:
+            document["timestamp"] = document["timestamp"].isoformat()
+        await self.storage.save_many(documents)
+
+
+def _wrap(conn, resource_name):
+    if isinstance(conn, FileStorage):
+        return FileSink(conn)
+    if isinstance(conn, AsyncIOMotorCollection):
+        return MongoSink(conn)
+    if isinstance(conn, Pool):
+        return MySQLSink(conn, resource_name)
+    return RedisSink()
+
+
+async def build_sinks(names):
+    sinks = []
+    for name in names:
+        if name == "redis":
+            sinks.append(RedisSink())
+            continue
+        backend = LOG_STORAGE_BACKEND if name == "log" else name
+        if backend.lower() == "redis":
+            sinks.append(RedisSink())  # Reutiliza el pool de redis_manager
+            continue
+        conn = await get_storage(backend, APP_LOG_FILE, LOG_STORAGE_NAME)
+        sinks.append(_wrap(conn, LOG_STORAGE_NAME))
+    print(f"[Sinks] Destinos de resultados: {[sink.name for sink in sinks]}")
+    return sinks
@@ -0,0 +1,252 @@
+"""Benchmark del scheduler en marcha: disparos por segundo, retraso, latencia HTTP y de la API.
+
+Registra N jobs con scheduler.add_cronjob_to_scheduler contra un destino HTTP
+local (un proceso aparte que responde siempre 200) y los deja disparar durante
+--duration segundos. Mide:
+
+  * disparos por segundo completados y fallidos
+  * retraso de planificación p50/p99 (hora programada -> disparo real)
+  * latencia HTTP p50/p99 (a partir del histograma de metrics)
+  * CPU (% de un núcleo) y RSS del proceso
+  * latencia p50/p99 de GET /cronjob/ y GET /cronjob/{id}/responses con la carga en curso
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_scheduler.py --jobs 1000 10000 --interval 60 --duration 30
+    python benchmarks/bench_scheduler.py --jobs 100000 --interval 60 --redis-url redis://localhost:6379/15
+
+Sin --redis-url usa fakeredis en memoria. La base indicada en --redis-url se vacía.
+"""
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import time
+import uuid
+
+os.environ.setdefault("METRICS_PER_JOB", "false")  # Series agregadas: el benchmark lee la etiqueta "all"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import httpx  # noqa: E402
+from apscheduler.events import EVENT_JOB_SUBMITTED  # noqa: E402
+
+import main  # noqa: E402
+import metrics  # noqa: E402
+import redis_manager  # noqa: E402
+import result_writer  # noqa: E402
+import scheduler  # noqa: E402
+
+STUB_BODY = b'{"ok": true}'
+
+
+# ========== DESTINO HTTP DE PRUEBA ==========
+class _StubProtocol(asyncio.Protocol):
+    # HTTP/1.1 mínimo con keep-alive: responde 200 a cada petición sin cuerpo
+    response = (b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n%s" % (len(STUB_BODY), STUB_BODY))
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = b""
+
+    def data_received(self, data):
+        self.buffer += data
+        while b"\r\n\r\n" in self.buffer:
+            _, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+            self.transport.write(self.response)
+
+
+def _serve_stub(sock):
+    async def serve():
+        server = await asyncio.get_running_loop().create_server(_StubProtocol, sock=sock)
+        await server.serve_forever()
+    asyncio.run(serve())
+
+
+def start_stub():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1024)
+    process = multiprocessing.Process(target=_serve_stub, args=(sock,), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{sock.getsockname()[1]}/"
+
+
+# ========== MEDICIÓN ==========
+def percentile(samples, q):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def histogram_quantile(histogram, q, *label_values):
+    # Interpolación lineal dentro del bucket, como histogram_quantile de Prometheus
+    state = histogram.values.get(label_values)
+    if state is None or not state[2]:
+        return float("nan")
+    counts, _, total = state
+    rank = q * total
+    cumulative, lower = 0, 0.0
+    for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+        if cumulative + count >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound
+    return lower
+
+
+def executions(result):
+    return metrics.executions_total.values.get(("all", result), 0)
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def rss_mb():
+    # RSS actual desde /proc (Linux); en otros sistemas el pico de getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure_api(client, path, requests):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get(path)
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return samples
+
+
+# ========== EJECUCIÓN ==========
+async def connect(redis_url):
+    if redis_url:
+        import redis.asyncio as aioredis
+        client = aioredis.from_url(redis_url, decode_responses=True)
+        await client.flushdb()
+        return client
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def run(count, args, target_url):
+    redis_manager.r = await connect(args.redis_url)
+    # Cada tamaño corre en un event loop nuevo: el semáforo global se crea otra vez en él
+    scheduler._semaphore = asyncio.Semaphore(scheduler.MAX_CONCURRENT_JOBS)
+    scheduler.scheduler.remove_all_jobs()
+    metrics.executions_total.values.clear()
+    metrics.http_latency.values.clear()
+
+    jobs = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"bench-{i}",
+            "script_path": {"url": f"{target_url}{i}", "method": "GET"},
+            "interval_seconds": args.interval,
+            "paused": False,
+            "max_responses": 10,
+        }
+        for i in range(count)
+    ]
+    lag_samples = []
+    measuring = False
+
+    def on_submitted(event):
+        if measuring:
+            lag = time.time() - event.scheduled_run_times[-1].timestamp()
+            lag_samples.append(max(lag, 0.0))
+
+    scheduler.scheduler.add_listener(on_submitted, EVENT_JOB_SUBMITTED)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(0, count, 5000):
+            await redis_manager.save_cronjobs(jobs[i:i + 5000])
+        started = time.perf_counter()
+        for job in jobs:
+            scheduler.add_cronjob_to_scheduler(job["id"], job["script_path"], job["interval_seconds"])
+        register_seconds = time.perf_counter() - started
+        await result_writer.start()
+        scheduler.scheduler.start()
+
+        # Un intervalo de calentamiento: las fases repartidas ya cubren todo el intervalo
+        await asyncio.sleep(min(args.interval, args.warmup))
+        measuring = True
+        done, failed, skipped_before = executions("success"), executions("failure"), executions("skipped")
+        cpu, wall = cpu_seconds(), time.perf_counter()
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            list_task = asyncio.create_task(measure_api(client, "/cronjob/", args.api_requests))
+            responses_task = asyncio.create_task(
+                measure_api(client, f"/cronjob/{jobs[0]['id']}/responses", args.api_requests))
+            await asyncio.sleep(args.duration)
+            list_samples = await list_task
+            responses_samples = await responses_task
+
+        elapsed = time.perf_counter() - wall
+        cpu_used = cpu_seconds() - cpu
+        measuring = False
+        fired = executions("success") - done
+        errors = executions("failure") - failed
+        skipped = executions("skipped") - skipped_before
+        memory = rss_mb()
+
+        scheduler.scheduler.shutdown(wait=False)
+        await asyncio.sleep(0)  # El shutdown del AsyncIOScheduler se ejecuta en el loop
+        # Dejar terminar las ejecuciones en curso antes de cerrar el cliente HTTP y Redis
+        deadline = time.perf_counter() + args.drain
+        while scheduler.execution_stats["in_flight"] + scheduler.execution_stats["waiting"]:
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.1)
+        await result_writer.stop()
+    scheduler.scheduler.remove_listener(on_submitted)
+    scheduler.scheduler.remove_all_jobs()
+    await scheduler.http_client.close_client()
+    await redis_manager.r.aclose()
+
+    ms = 1000
+    print(f"{count:>7} jobs cada {args.interval}s | registro {register_seconds:6.2f}s"
+          f" | {fired / elapsed:8.1f} disparos/s ({errors} fallos, {skipped} omitidos)"
+          f" | lag p50 {percentile(lag_samples, 0.5) * ms:7.1f}ms p99 {percentile(lag_samples, 0.99) * ms:7.1f}ms"
+          f" | http p50 {histogram_quantile(metrics.http_latency, 0.5, 'all') * ms:6.1f}ms"
+          f" p99 {histogram_quantile(metrics.http_latency, 0.99, 'all') * ms:6.1f}ms"
+          f" | CPU {cpu_used / elapsed * 100:5.1f}% | RSS {memory:7.1f}MB")
+    print(f"{'':>7}      GET /cronjob/ p50 {percentile(list_samples, 0.5) * ms:8.1f}ms"
+          f" p99 {percentile(list_samples, 0.99) * ms:8.1f}ms"
+          f" | GET /cronjob/{{id}}/responses p50 {percentile(responses_samples, 0.5) * ms:6.1f}ms"
+          f" p99 {percentile(responses_samples, 0.99) * ms:6.1f}ms")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--interval", type=int, default=60, help="interval_seconds de cada job")
+    parser.add_argument("--duration", type=float, default=30, help="segundos de medición")
+    parser.add_argument("--warmup", type=float, default=10, help="segundos antes de medir (máximo un intervalo)")
+    parser.add_argument("--api-requests", type=int, default=20, help="peticiones a cada endpoint de la API")
+    parser.add_argument("--drain", type=float, default=15, help="segundos máximos para terminar lo que está en curso")
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    stub, target_url = start_stub()
+    try:
+        for count in args.jobs:
+            asyncio.run(run(count, args, target_url))
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main_cli()
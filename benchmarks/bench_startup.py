@@ -0,0 +1,84 @@
+"""Benchmark del arranque en frío: lectura masiva de jobs y registro en el scheduler.
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_startup.py --jobs 10000 100000
+    python benchmarks/bench_startup.py --jobs 10000 --redis-url redis://localhost:6379/15
+
+Sin --redis-url usa fakeredis en memoria. La base indicada en --redis-url se vacía.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import redis_manager  # noqa: E402
+import scheduler  # noqa: E402
+
+
+async def connect(redis_url):
+    if redis_url:
+        import redis.asyncio as aioredis
+        client = aioredis.from_url(redis_url, decode_responses=True)
+        await client.flushdb()
+        return client
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+async def seed(count):
+    jobs = [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"bench-{i}",
+            "script_path": {"url": f"http://127.0.0.1:9/{i}", "method": "GET"},
+            "interval_seconds": 60 + i % 300,
+            "paused": i % 10 == 0,
+        }
+        for i in range(count)
+    ]
+    for i in range(0, count, 5000):
+        await redis_manager.save_cronjobs(jobs[i:i + 5000])
+
+
+async def run(count, redis_url):
+    redis_manager.r = await connect(redis_url)
+    scheduler.scheduler.remove_all_jobs()
+    await seed(count)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        jobs = await redis_manager.get_all_cronjobs(repair=True)
+        read_done = time.perf_counter()
+        registered = scheduler.register_jobs(jobs)
+        register_done = time.perf_counter()
+        scheduler.scheduler.start(paused=True)  # Registra los pendientes sin disparar jobs
+        start_done = time.perf_counter()
+
+    print(f"{count:>8} jobs | lectura {read_done - started:7.3f}s | registro {register_done - read_done:7.3f}s"
+          f" | start {start_done - register_done:7.3f}s | total {start_done - started:7.3f}s"
+          f" | {registered} activos")
+
+    scheduler.scheduler.shutdown(wait=False)
+    await asyncio.sleep(0)  # El shutdown del AsyncIOScheduler se ejecuta en el loop
+    scheduler.scheduler.remove_all_jobs()
+    await redis_manager.r.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    for count in args.jobs:
+        asyncio.run(run(count, args.redis_url))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Reparto de jobs entre varias instancias del cluster sobre un mismo Redis (fakeredis)."""
+import asyncio
+import os
+import sys
+
+import fakeredis
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from cluster import ClusterMembership  # noqa: E402
+
+JOB_IDS = [f"job-{i}" for i in range(600)]
+
+
+def members(*instance_ids, **options):
+    # Cada instancia con su propia conexión al mismo servidor, como procesos distintos
+    server = fakeredis.FakeServer()
+    return [ClusterMembership(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), instance_id, **options)
+            for instance_id in instance_ids]
+
+
+async def join(cluster):
+    # Dos rondas de heartbeat: en la primera las primeras instancias aún no ven a las últimas
+    for _ in range(2):
+        for member in cluster:
+            await member.heartbeat()
+
+
+def owners(cluster, job_id):
+    return [member.instance_id for member in cluster if member.owns(job_id)]
+
+
+def test_every_job_has_exactly_one_owner():
+    async def scenario():
+        cluster = members("a", "b", "c")
+        await join(cluster)
+        assert all(member.members == ("a", "b", "c") for member in cluster)
+        assignment = {job_id: owners(cluster, job_id) for job_id in JOB_IDS}
+        assert all(len(found) == 1 for found in assignment.values())
+        counts = {member.instance_id: sum(found == [member.instance_id] for found in assignment.values())
+                  for member in cluster}
+        assert all(count > len(JOB_IDS) / 6 for count in counts.values()), counts
+
+    asyncio.run(scenario())
+
+
+def test_rebalance_after_member_leaves():
+    async def scenario():
+        a, b, c = cluster = members("a", "b", "c")
+        await join(cluster)
+        before = {job_id: owners(cluster, job_id)[0] for job_id in JOB_IDS}
+
+        await a.stop()
+        assert await b.heartbeat() and await c.heartbeat()
+        assert b.members == c.members == ("b", "c")
+        for job_id in JOB_IDS:
+            found = owners([b, c], job_id)
+            assert len(found) == 1
+            # Hashing consistente: solo cambian de dueño los jobs de la instancia que salió
+            if before[job_id] != "a":
+                assert found == [before[job_id]]
+
+    asyncio.run(scenario())
+
+
+def test_expired_lease_leaves_the_ring():
+    async def scenario():
+        a, b = members("a", "b", lease_seconds=0.2)
+        await join([a, b])
+        assert b.members == ("a", "b")
+        await asyncio.sleep(0.1)
+        await b.heartbeat()  # a no renueva su lease
+        await asyncio.sleep(0.15)
+        assert await b.heartbeat()
+        assert b.members == ("b",)
+        assert all(b.owns(job_id) for job_id in JOB_IDS)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("instances", [2, 5])
+def test_claim_fire_is_exclusive(instances):
+    async def scenario():
+        cluster = members(*[f"node-{i}" for i in range(instances)])
+        claims = await asyncio.gather(*[member.claim_fire("job-1", 0.1) for member in cluster])
+        assert sum(claims) == 1
+        # Otro job no se ve afectado por la reserva
+        assert await cluster[-1].claim_fire("job-2", 0.1)
+        # Vencida la reserva el siguiente disparo se puede volver a reclamar
+        await asyncio.sleep(0.15)
+        assert sum(await asyncio.gather(*[member.claim_fire("job-1", 0.1) for member in cluster])) == 1
+
+    asyncio.run(scenario())
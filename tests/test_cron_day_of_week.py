@@ -0,0 +1,57 @@
+"""Días de disparo de las expresiones cron con campo día de la semana en numeración crontab."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import scheduler  # noqa: E402
+
+WEEK = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+
+def fire_days(day_of_week):
+    trigger = scheduler.build_trigger("test", {"cron": f"0 2 * * {day_of_week}", "timezone": "UTC"})
+    fire_time, now = None, datetime(2026, 1, 4, tzinfo=timezone.utc)  # Domingo
+    days = set()
+    for _ in range(7):
+        fire_time = trigger.get_next_fire_time(fire_time, now)
+        days.add(fire_time.strftime("%a").lower())
+        now = fire_time + timedelta(seconds=1)
+    return [day for day in WEEK if day in days]
+
+
+@pytest.mark.parametrize("day_of_week, expected", [
+    ("*", WEEK),
+    ("0-6", WEEK),
+    ("0-4", ["sun", "mon", "tue", "wed", "thu"]),
+    ("*/2", ["sun", "tue", "thu", "sat"]),
+    ("1-5/2", ["mon", "wed", "fri"]),
+    ("1-5", ["mon", "tue", "wed", "thu", "fri"]),
+    ("5-7", ["sun", "fri", "sat"]),
+    ("7", ["sun"]),
+    ("0,6", ["sun", "sat"]),
+    ("mon-fri", ["mon", "tue", "wed", "thu", "fri"]),
+])
+def test_crontab_day_of_week(day_of_week, expected):
+    assert fire_days(day_of_week) == expected
+
+
+@pytest.mark.parametrize("day_of_week", ["8", "5-2", "*/0", "foo"])
+def test_invalid_day_of_week(day_of_week):
+    with pytest.raises(ValueError):
+        scheduler.build_trigger("test", {"cron": f"0 2 * * {day_of_week}"})
+
+
+def test_day_of_month_or_day_of_week():
+    # Como en crontab: el día 1 de cada mes y además todos los lunes
+    trigger = scheduler.build_trigger("test", {"cron": "0 0 1 * 1", "timezone": "UTC"})
+    fire_time, now = None, datetime(2026, 4, 25, tzinfo=timezone.utc)
+    fires = []
+    for _ in range(4):
+        fire_time = trigger.get_next_fire_time(fire_time, now)
+        fires.append(fire_time.date().isoformat())
+        now = fire_time + timedelta(seconds=1)
+    assert fires == ["2026-04-27", "2026-05-01", "2026-05-04", "2026-05-11"]